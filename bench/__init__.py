@@ -0,0 +1,197 @@
+"""Micro benchmark harness, runs on CPython and on MicroPython with ulab.
+
+Stage times are also reported relative to a reference loop doing the same
+kind of work, float arithmetic and calls in Python or a ulab/numpy vector
+operation, in short rounds alternating with those of the stage. Baselines
+store the median of that ratio over the runs, so they can be compared
+between machines of the same platform and a busy machine slows both sides
+alike. Allocations are
+measured with tracemalloc on CPython and gc.mem_alloc() on MicroPython.
+"""
+import gc
+import json
+import sys
+import time
+from array import array
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+try:
+    from ulab import numpy as np
+except ImportError:
+    try:
+        import numpy as np
+    except ImportError:
+        np = None
+
+if hasattr(time, "perf_counter_ns"):
+    def now_us():
+        return time.perf_counter_ns() // 1000
+else:
+    def now_us():
+        return time.ticks_us()
+
+PLATFORM = "micropython-ulab" if sys.implementation.name == "micropython" else "cpython-numpy"
+
+
+_REF_VALUES = array('f', [i / 100 for i in range(200)])
+
+
+def _ref_step(v):
+    return v * 1.5 + 0.25
+
+
+def _ref_python():
+    s = 0.0
+    values = _REF_VALUES
+    for i in range(len(values)):
+        s += _ref_step(values[i])
+    return s
+
+
+_REF_ND = np.linspace(0, 2, 1000) if np is not None else None
+
+
+def _ref_ulab():
+    return np.sum(np.clip(_REF_ND * 1.5 + 0.25, 0.5, 2.5))
+
+
+# Reference loop of each kind of stage
+REFERENCES = {"python": _ref_python, "ulab": _ref_ulab if np is not None else _ref_python}
+
+
+def median(values):
+    values = sorted(values)
+    n = len(values)
+    return (values[(n - 1) // 2] + values[n // 2]) / 2
+
+
+def _round_us(fn, repeat):
+    start = now_us()
+    for _ in range(repeat):
+        fn()
+    return (now_us() - start) / repeat
+
+
+def _calibrate(fn, repeat, min_round_us):
+    """repeat doubled until one round takes min_round_us, so short stages
+    are not lost in timer resolution and scheduling noise."""
+    fn()
+    while _round_us(fn, repeat) * repeat < min_round_us:
+        repeat *= 2
+    return repeat
+
+
+def time_pair(fn, ref, repeat=1, rounds=15, min_round_us=1000):
+    """Best of rounds of fn and of ref in microseconds per call.
+
+    The rounds of both alternate, so they are timed under the same load.
+    """
+    repeat = _calibrate(fn, repeat, min_round_us)
+    ref_repeat = _calibrate(ref, 1, min_round_us)
+    best = best_ref = None
+    for _ in range(rounds):
+        us = _round_us(fn, repeat)
+        ref_us = _round_us(ref, ref_repeat)
+        best = us if best is None or us < best else best
+        best_ref = ref_us if best_ref is None or ref_us < best_ref else best_ref
+    return best, best_ref
+
+
+def alloc_bytes(fn):
+    """Peak bytes allocated by one call."""
+    gc.collect()
+    if tracemalloc is not None:
+        tracemalloc.start()
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return peak
+    gc.disable()
+    try:
+        before = gc.mem_alloc()
+        fn()
+        return gc.mem_alloc() - before
+    finally:
+        gc.enable()
+
+
+class Suite:
+    def __init__(self, name):
+        self.name = name
+        self.stages = []
+        self.results = {}
+
+    def add(self, name, group, fn, repeat=1, ref="python"):
+        """ref is the REFERENCES kind the stage is timed against."""
+        self.stages.append((name, group, fn, repeat, ref))
+
+    def run(self, quiet=None, runs=5):
+        """Measure every stage runs times, keeping the medians.
+
+        The rounds of every stage alternate with those of its reference
+        loop, so a slow patch of the machine shows up in both. quiet is an
+        optional context manager silencing the stages.
+        """
+        samples = {}
+        for _ in range(runs):
+            for name, group, fn, repeat, ref in self.stages:
+                if quiet is not None:
+                    with quiet():
+                        us, ref_us = time_pair(fn, REFERENCES[ref], repeat)
+                else:
+                    us, ref_us = time_pair(fn, REFERENCES[ref], repeat)
+                samples.setdefault(name, []).append((us, us / ref_us))
+        for name, group, fn, repeat, ref in self.stages:
+            if quiet is not None:
+                with quiet():
+                    allocated = alloc_bytes(fn)
+            else:
+                allocated = alloc_bytes(fn)
+            times = samples[name]
+            self.results[name] = {"group": group, "us": round(median([t[0] for t in times]), 2),
+                                  "rel": round(median([t[1] for t in times]), 4), "bytes": allocated}
+        return self.results
+
+    def report(self):
+        print("%-48s %-14s %12s %10s %10s" % (self.name, "group", "us/call", "rel", "bytes"))
+        for name, r in self.results.items():
+            print("%-48s %-14s %12.2f %10.4f %10d" % (name, r["group"], r["us"], r["rel"], r["bytes"]))
+
+    def compare(self, baseline, groups, threshold):
+        """Return regressions of the gated groups against a baseline dict."""
+        regressions = []
+        for name, r in self.results.items():
+            base = baseline.get(name)
+            if base is None or r["group"] not in groups:
+                continue
+            if r["rel"] > base["rel"] * (1 + threshold):
+                regressions.append("%s: time %.4f -> %.4f" % (name, base["rel"], r["rel"]))
+            # Small absolute slack, allocator bookkeeping differs slightly between runs
+            if r["bytes"] > base["bytes"] * (1 + threshold) + 64:
+                regressions.append("%s: allocations %d -> %d bytes" % (name, base["bytes"], r["bytes"]))
+        return regressions
+
+
+def load_baseline(path, suite):
+    try:
+        with open(path) as f:
+            return json.load(f).get(PLATFORM, {}).get(suite, {})
+    except OSError:
+        return {}
+
+
+def save_baseline(path, suite, results):
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except OSError:
+        data = {}
+    data.setdefault(PLATFORM, {})[suite] = {
+        name: {"group": r["group"], "rel": r["rel"], "bytes": r["bytes"]} for name, r in results.items()
+    }
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
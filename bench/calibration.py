@@ -0,0 +1,158 @@
+"""Benchmark of the pH calibration and per-sample conversion pipeline.
+
+    python -m bench.calibration                 # run and compare with baseline.json
+    python -m bench.calibration --update        # record a new baseline
+    python -m bench.calibration --threshold 0.5
+
+Exits with status 1 if a recalibration or conversion stage got slower, or
+allocates more, than the baseline by more than the threshold. On the board
+run main([]) after copying bench/ next to extension.py. The accuracy of the
+fixed point conversion is checked by tests/test_fixed_point.py.
+"""
+import sys
+from array import array
+
+from bench import Suite, load_baseline, save_baseline
+
+try:
+    from ulab import numpy as np
+except ImportError:
+    import numpy as np
+
+BASELINE = __file__.rsplit("/", 1)[0] + "/baseline.json" if "/" in __file__ else "baseline.json"
+GATED = ("recalibration", "conversion")
+THRESHOLD = 0.5
+
+
+def load_extension():
+    try:
+        import sim
+    except ImportError:
+        # On the board the extension and its upstream modules are importable
+        import extension
+        return extension
+    import os
+    import tempfile
+    sim.install()
+    cwd = os.getcwd()
+    # Importing the extension creates its config/history files in the working directory
+    os.chdir(tempfile.mkdtemp(prefix="reefrhythm-bench-"))
+    try:
+        import extension
+    finally:
+        os.chdir(cwd)
+    return extension
+
+
+def quiet():
+    try:
+        import contextlib
+        import io
+    except ImportError:
+        return None
+    return lambda: contextlib.redirect_stdout(io.StringIO())
+
+
+def cal_points(n):
+    """n calibration points from pH 2 to 12, slightly non-linear like a real probe."""
+    points = {}
+    for i in range(n):
+        ph = 2 + 10 * i / (n - 1)
+        points[str(i)] = {"ph": ph, "adc": 2.5 - 0.177 * (ph - 2) + 0.002 * (ph - 7) ** 2}
+    return points
+
+
+def build_suite(ext):
+    suite = Suite("calibration")
+
+    for n in (2, 3, 5, 10):
+        data = cal_points(n)
+        suite.add("linear_interpolation n=%d" % n, "recalibration",
+                  lambda data=data: ext.linear_interpolation(data))
+    for num in (50, 100):
+        data = cal_points(5)
+        suite.add("linear_interpolation n=5 num_points=%d" % num, "recalibration",
+                  lambda data=data, num=num: ext.linear_interpolation(data, num_points=num))
+    for n in (3, 10):
+        chart = ext.linear_interpolation(cal_points(n))
+        suite.add("extrapolate n=%d" % n, "recalibration", lambda chart=chart: ext.extrapolate(chart))
+    chart = ext.linear_interpolation(cal_points(10))
+    shuffled = chart[1::2] + chart[::2]
+    suite.add("manual_sort %d points" % len(shuffled), "recalibration", lambda: ext.manual_sort(shuffled))
+
+    ph_points, adc_points = ext.extrapolate(ext.linear_interpolation(cal_points(5)))
+    converter = ext.PhConverter()
+    suite.add("PhConverter.compile n=5", "recalibration", lambda: converter.compile(ph_points, adc_points))
+    points = cal_points(5)
+    suite.add("PhConverter.fit n=5", "recalibration", lambda: converter.fit(points))
+    suite.add("PhConverter.fit n=5 nernst", "recalibration", lambda: converter.fit(points, "nernst"))
+    converter.fit(points)
+
+    raw = [(i * 37) % 4096 for i in range(1000)]
+    suite.add("adc_to_volt x1000", "conversion", lambda: [ext.adc_to_volt(v) for v in raw])
+    suite.add("adc_to_mv x1000", "conversion", lambda: [ext.adc_to_mv(v) for v in raw])
+    for window in (5, 100):
+        values = [ext.adc_to_volt(v) for v in raw[:window]]
+        suite.add("calculate_average window=%d" % window, "conversion",
+                  lambda values=values: ext.calculate_average(values))
+    for typecode in ('f', 'l'):
+        channel = ext.SensorChannel(5, typecode=typecode)
+        values = [ext.adc_to_volt(v) if typecode == 'f' else ext.adc_to_mv(v) for v in raw[:100]]
+
+        def push_mean(channel=channel, values=values):
+            for v in values:
+                channel.push(v)
+            channel.mean()
+        suite.add("SensorChannel push x100 typecode=%s" % typecode, "conversion", push_mean)
+
+    volts = array('f', [0.5 + 2.0 * i / 1000 for i in range(1000)])
+    out = array('f', [0] * 1000)
+
+    def convert_each():
+        convert = converter.convert
+        for v in volts:
+            convert(v)
+    suite.add("PhConverter.convert x1000", "conversion", convert_each)
+    uvs = array('l', [int(round(v * 1000000)) for v in volts])
+
+    def convert_each_uv():
+        convert_uv = converter.convert_uv
+        for uv in uvs:
+            convert_uv(uv)
+    suite.add("PhConverter.convert_uv x1000", "conversion", convert_each_uv)
+    suite.add("PhConverter.convert_batch x1000 array", "conversion",
+              lambda: converter.convert_batch(volts, out))
+    nd = np.array(list(volts))
+    suite.add("PhConverter.convert_batch x1000 ndarray", "conversion",
+              lambda: converter.convert_batch(nd), ref="ulab")
+    return suite
+
+
+def main(argv):
+    update = "--update" in argv
+    threshold = THRESHOLD
+    if "--threshold" in argv:
+        threshold = float(argv[argv.index("--threshold") + 1])
+
+    silence = quiet()
+    if silence is not None:
+        # The pipeline prints its input, keep the report readable
+        with silence():
+            suite = build_suite(load_extension())
+    else:
+        suite = build_suite(load_extension())
+    suite.run(silence)
+    suite.report()
+
+    if update:
+        save_baseline(BASELINE, suite.name, suite.results)
+        print("Baseline updated")
+        return 0
+    regressions = suite.compare(load_baseline(BASELINE, suite.name), GATED, threshold)
+    for r in regressions:
+        print("REGRESSION", r)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,185 @@
+"""Build the extension for the firmware image.
+
+    python3 build_extension.py [--install]
+
+Cross-compiles the extension modules to .mpy bytecode with mpy-cross,
+writes minified and gzipped variants of the extension pages and a
+manifest (src/extension_manifest.json) that StaticPage reads for the page
+ETags. --install puts the .mpy files into src in place of the sources and
+drops the raw pages, so only the build output is frozen. Runs offline, the
+size of every artifact and the compile work it saves at import is
+reported at the end.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import runpy
+import shutil
+import subprocess
+import sys
+import time
+
+SRC = './src'
+OUT = './build/extension'
+MANIFEST = 'extension_manifest.json'
+
+# Extension pages served by the /ato and /ph routes, relative to src
+PAGES = ['ato/static/ato.html', 'ph/static/ph.html']
+# The module list of the extension, it stays source so --install can run again
+MODULE_LIST = 'extension_modules.py'
+
+
+def extension_modules(src=SRC):
+    """Source files of the extension modules, listed once in src/extension_modules.py."""
+    names = runpy.run_path(os.path.join(src, MODULE_LIST))['MODULES']
+    return ['extension.py'] + [name + '.py' for name in names]
+
+
+# Extension modules compiled to .mpy
+MODULES = extension_modules()
+
+# -O1 drops the `if __debug__:` debug logging blocks
+MPY_CROSS_ARGS = ['-O1']
+MPY_CROSS_SRC = './micropython/mpy-cross'
+MPY_CROSS_PATHS = [MPY_CROSS_SRC + '/build/mpy-cross', MPY_CROSS_SRC + '/mpy-cross']
+# Comments and script elements of a page, comments may span lines
+HTML_BLOCK = re.compile(r'(<!--.*?-->|<script\b.*?</script\s*>)', re.S | re.I)
+# Trailing spaces, a line break and the indentation and blank lines after it
+LINE_BREAK = re.compile(r'[ \t]*\n\s*')
+
+
+def minify_html(text):
+    """Drop indentation, blank lines and comments, script elements are copied unchanged."""
+    out = []
+    markup = ''
+    for i, part in enumerate(HTML_BLOCK.split(text)):
+        if not i % 2:
+            markup += part
+        elif not part.startswith('<!--'):
+            out.append(LINE_BREAK.sub('\n', markup))
+            out.append(part)
+            markup = ''
+    out.append(LINE_BREAK.sub('\n', markup))
+    return ''.join(out).strip() + '\n'
+
+
+def build_page(src, page):
+    path = os.path.join(src, page)
+    with open(path, 'rb') as f:
+        data = f.read()
+    minified = minify_html(data.decode()).encode()
+    # Fixed mtime keeps the archive, and so the ETag, stable between builds
+    packed = gzip.compress(minified, compresslevel=9, mtime=0)
+    with open(path + '.gz', 'wb') as f:
+        f.write(packed)
+    digest = hashlib.sha256(minified).hexdigest()[:16]
+    return {
+        'gz': True,
+        'raw': True,
+        'etag': 'W/"%s"' % digest,
+        'size': len(data),
+        'min_size': len(minified),
+        'gz_size': len(packed),
+    }
+
+
+def find_mpy_cross(path=None):
+    candidates = [path, os.environ.get('MPY_CROSS'), shutil.which('mpy-cross')] + MPY_CROSS_PATHS
+    for candidate in candidates:
+        if candidate and os.access(candidate, os.X_OK):
+            return candidate
+    # The firmware build checks out micropython, build its mpy-cross once
+    if os.path.isfile(os.path.join(MPY_CROSS_SRC, 'Makefile')):
+        print(f"Building mpy-cross in {MPY_CROSS_SRC}")
+        if subprocess.run(['make', '-C', MPY_CROSS_SRC]).returncode == 0 and os.access(MPY_CROSS_PATHS[0], os.X_OK):
+            return MPY_CROSS_PATHS[0]
+    return None
+
+
+def compile_ms(source, name, runs=5):
+    """Host parse+compile time, a measure of the work an .mpy saves at import."""
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        compile(source, name, 'exec')
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None or elapsed < best else best
+    return best
+
+
+def build_module(src, out, module, mpy_cross):
+    path = os.path.join(src, module)
+    with open(path, 'rb') as f:
+        source = f.read()
+    target = os.path.join(out, module[:-3] + '.mpy')
+    subprocess.run([mpy_cross] + MPY_CROSS_ARGS + ['-s', module, '-o', target, path], check=True)
+    with open(target, 'rb') as f:
+        mpy = f.read()
+    return {
+        'mpy': module[:-3] + '.mpy',
+        'size': len(source),
+        'mpy_size': len(mpy),
+        'sha256': hashlib.sha256(mpy).hexdigest()[:16],
+        'compile_ms': round(compile_ms(source, module), 3),
+    }
+
+
+def install(src, out, manifest):
+    for module, entry in manifest['modules'].items():
+        shutil.copyfile(os.path.join(out, entry['mpy']), os.path.join(src, entry['mpy']))
+        # MicroPython imports the .py first when both are there
+        os.remove(os.path.join(src, module))
+    for page, entry in manifest['pages'].items():
+        os.remove(os.path.join(src, page))
+        entry['raw'] = False
+
+
+def report(manifest):
+    print(f"{'artifact':<32} {'source':>8} {'built':>8} {'gzip':>8} {'saved':>12}")
+    for page, entry in manifest['pages'].items():
+        print(f"{page:<32} {entry['size']:>8} {entry['min_size']:>8} {entry['gz_size']:>8} "
+              f"{entry['size'] - entry['gz_size']:>10} B")
+    total = 0
+    for module, entry in manifest['modules'].items():
+        total += entry['compile_ms']
+        print(f"{module:<32} {entry['size']:>8} {entry['mpy_size']:>8} {'-':>8} "
+              f"{entry['compile_ms']:>9.2f} ms")
+    if manifest['modules']:
+        # Measured on the build host, the controller compiles many times slower
+        print(f"Compile work skipped at import: {total:.2f} ms on this host")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--src', default=SRC)
+    parser.add_argument('--out', default=OUT)
+    parser.add_argument('--mpy-cross', help="mpy-cross binary, default: $MPY_CROSS, PATH, ./micropython")
+    parser.add_argument('--install', action='store_true', help="replace sources in src with the build")
+    args = parser.parse_args(argv)
+
+    manifest = {'pages': {}, 'modules': {}}
+    for page in PAGES:
+        if os.path.exists(os.path.join(args.src, page)):
+            manifest['pages'][page] = build_page(args.src, page)
+
+    mpy_cross = find_mpy_cross(args.mpy_cross)
+    if mpy_cross is None:
+        print("mpy-cross not found, extension modules are shipped as source", file=sys.stderr)
+    else:
+        os.makedirs(args.out, exist_ok=True)
+        for module in MODULES:
+            if os.path.exists(os.path.join(args.src, module)):
+                manifest['modules'][module] = build_module(args.src, args.out, module, mpy_cross)
+
+    if args.install:
+        install(args.src, args.out, manifest)
+    with open(os.path.join(args.src, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    report(manifest)
+
+
+if __name__ == '__main__':
+    main()
@@ -49,21 +49,46 @@ def setup():
             """\
 import gc
 import time
+_boot_last = time.ticks_ms()
+_boot_steps = []
+
+
+def _boot_step(name):
+    # (name, ms, heap allocated), handed to boot_profile once the app is on flash
+    global _boot_last
+    now = time.ticks_ms()
+    _boot_steps.append((name, time.ticks_diff(now, _boot_last), gc.mem_alloc()))
+    _boot_last = now
+
+
 import asyncio
+_boot_step("import asyncio")
 print("Extract app to flash")
-extart_start = time.time()
 import frozen_app
-print(f"Finished in {time.time()-extart_start}sec")
+_boot_step("import frozen_app")
+print(f"Finished in {_boot_steps[-1][1]}ms")
 
 from lib.servo42c import *
+_boot_step("import lib.servo42c")
 from config.pin_config import *
+_boot_step("import config.pin_config")
+
+try:
+    import boot_profile
+    boot_profile.add_steps(_boot_steps)
+except ImportError:
+    boot_profile = None
 
 
 if __name__ == '__main__':
     gc.collect()
     print('Start')
     import connect_wifi
+    if boot_profile:
+        boot_profile.mark("import connect_wifi")
     import web
+    if boot_profile:
+        boot_profile.mark("import web")
 
     loop = asyncio.get_event_loop()
     loop.run_forever()
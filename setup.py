@@ -1,60 +1,213 @@
-import sys
-
-import requests
-import tarfile
+import argparse
+import hashlib
+import json
 import os
 import shutil
+import sys
+import tarfile
+import urllib.error
+import urllib.request
+from urllib.parse import urlparse
+from urllib.request import url2pathname
+
+from build_extension import MODULE_LIST, MODULES
+
+# Upstream firmware parts fetched into the tree
+PARTS = ('src', 'scripts', 'boards')
+# Extension files in src that the upstream sources don't own
+KEEP = {'src': ['ato', 'ph', MODULE_LIST] + MODULES,
+        'scripts': [], 'boards': []}
+
+TAG = "latest"
+URL = "https://github.com/telenkov88/reefrhythm-smartdoser/archive/refs/tags/{tag}.tar.gz"
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'reefrhythm-smartdoser')
+CHUNK = 1 << 16
+
+
+def sha256_file(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class Cache:
+    """Archives stored by content hash, index.json maps each URL to its archive and HTTP ETag."""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.index_path = os.path.join(path, 'index.json')
+        try:
+            with open(self.index_path) as f:
+                self.index = json.load(f)
+        except (OSError, ValueError):
+            self.index = {}
+
+    def lookup(self, url):
+        entry = self.index.get(url)
+        if entry and os.path.exists(self.archive(entry['sha256'])):
+            return entry
+        return None
+
+    def archive(self, digest):
+        return os.path.join(self.path, digest + '.tar.gz')
+
+    def store(self, url, tmp, etag=None):
+        digest = sha256_file(tmp)
+        os.replace(tmp, self.archive(digest))
+        self.index[url] = {'sha256': digest, 'etag': etag}
+        with open(self.index_path + '.tmp', 'w') as f:
+            json.dump(self.index, f, indent=1)
+        os.replace(self.index_path + '.tmp', self.index_path)
+        return self.archive(digest)
+
 
+def download(url, cache, offline=False):
+    """Path of the cached archive of url, fetched or revalidated unless offline."""
+    entry = cache.lookup(url)
+    if offline:
+        if entry is None:
+            sys.exit(f"{url} is not cached, run once without --offline")
+        print(f"Offline, using cached {entry['sha256'][:12]}")
+        return cache.archive(entry['sha256'])
 
-def clean_directory_except(base_path, keep_patterns):
-    """ Remove all subdirectories in the base_path except the keep_patterns """
+    request = urllib.request.Request(url)
+    if entry and entry.get('etag'):
+        # Tags like "latest" move, so the cache is revalidated instead of trusted
+        request.add_header('If-None-Match', entry['etag'])
+    tmp = os.path.join(cache.path, 'download.part')
     try:
-        os.stat(base_path)
-    except Exception as e:
-        print(f"{base_path}: ", e)
-        return True
-    for subdir in os.listdir(base_path):
-        full_path = os.path.join(base_path, subdir)
-        if os.path.isdir(full_path) and not any(full_path.endswith(pattern) for pattern in keep_patterns):
-            shutil.rmtree(full_path)
-        elif not any(full_path.endswith(pattern) for pattern in keep_patterns):
-            os.remove(full_path)
-
-
-print("Clean src")
-clean_directory_except('./src', ['ato', 'ph', 'extension.py', 'ads1x15.py'])
-print("Clean scripts")
-clean_directory_except('./scripts', ["_skip"])
-print("Clean boards")
-clean_directory_except('./boards', ["_skip"])
-
-# Download the archive
-tag = "latest"
-url = f"https://github.com/telenkov88/reefrhythm-smartdoser/archive/refs/tags/{tag}.tar.gz"
-response = requests.get(url)
-
-# Save the downloaded content to a .tar.gz file
-archive_path = 'build.tar.gz'
-with open(archive_path, 'wb') as file:
-    file.write(response.content)
-    print()
-
-# Extract specific folders from the archive
-with tarfile.open(archive_path, "r:gz") as tar:
-    members = tar.getmembers()
-    # Modify the path and extract 'src' and 'scripts' directories
-    for member in members:
-        if member.name.startswith(f"reefrhythm-smartdoser-{tag}/src") or \
-                member.name.startswith(f"reefrhythm-smartdoser-{tag}/scripts") or \
-                member.name.startswith(f"reefrhythm-smartdoser-{tag}/boards"):
-            member.name = '/'.join(member.name.split('/')[1:])  # Remove the first directory from the path
-            tar.extract(member, path='.')
-
-os.remove(archive_path)
-
-with open("./src/config/pin_config.py", 'r') as pin_config:
-    config = pin_config.read()
-    config = config.replace("analog_pins = [5, 6, 7, 15, 16, 17, 18, 8, 3]  # Allowed ADC pins for pumps control",
-                   "analog_pins = [7, 15, 16, 17, 18, 8, 3]  # Allowed ADC pins for pumps control")
-with open("./src/config/pin_config.py", 'w') as pin_config:
-    pin_config.write(config)
+        with urllib.request.urlopen(request, timeout=30) as response, open(tmp, 'wb') as f:
+            shutil.copyfileobj(response, f, CHUNK)
+            etag = response.headers.get('ETag')
+    except OSError as e:
+        if isinstance(e, urllib.error.HTTPError) and e.code == 304:
+            print(f"Not modified, using cached {entry['sha256'][:12]}")
+            return cache.archive(entry['sha256'])
+        if entry is None:
+            raise
+        print(f"Download failed ({e}), using cached {entry['sha256'][:12]}")
+        return cache.archive(entry['sha256'])
+    print(f"Downloaded {os.path.getsize(tmp)} bytes")
+    return cache.store(url, tmp, etag)
+
+
+def unchanged(target, size, mtime):
+    try:
+        st = os.stat(target)
+    except OSError:
+        return False
+    return st.st_size == size and int(st.st_mtime) == int(mtime)
+
+
+def extract(archive, dest='.'):
+    """Extract PARTS from the archive in one streaming pass, return the written paths.
+
+    The archive's top directory is stripped. Files with the size and mtime
+    of their member are left alone.
+    """
+    written = set()
+    updated = 0
+    with tarfile.open(archive, 'r|gz') as tar:
+        for member in tar:
+            parts = member.name.split('/')[1:]
+            if not parts or parts[0] not in PARTS or '..' in parts:
+                continue
+            target = os.path.join(dest, *parts)
+            if not (member.isdir() or member.isfile()):
+                continue
+            written.add(os.path.normpath(target))
+            if member.isdir():
+                os.makedirs(target, exist_ok=True)
+                continue
+            if unchanged(target, member.size, member.mtime):
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with tar.extractfile(member) as src, open(target, 'wb') as dst:
+                shutil.copyfileobj(src, dst, CHUNK)
+            os.chmod(target, member.mode & 0o777)
+            os.utime(target, (member.mtime, member.mtime))
+            updated += 1
+    print(f"Extracted {updated} of {len(written)} entries")
+    return written
+
+
+def copy_tree(source, dest='.'):
+    """Same as extract() for an unpacked source checkout."""
+    written = set()
+    updated = 0
+    for part in PARTS:
+        for root, _, files in os.walk(os.path.join(source, part)):
+            rel = os.path.relpath(root, source)
+            os.makedirs(os.path.join(dest, rel), exist_ok=True)
+            written.add(os.path.normpath(os.path.join(dest, rel)))
+            for name in files:
+                src = os.path.join(root, name)
+                target = os.path.join(dest, rel, name)
+                written.add(os.path.normpath(target))
+                st = os.stat(src)
+                if unchanged(target, st.st_size, st.st_mtime):
+                    continue
+                shutil.copy2(src, target)
+                updated += 1
+    print(f"Copied {updated} of {len(written)} entries")
+    return written
+
+
+def remove_stale(written, dest='.'):
+    """Remove files of PARTS the sources no longer have, except the KEEP entries."""
+    for part in PARTS:
+        base = os.path.join(dest, part)
+        if not os.path.isdir(base):
+            continue
+        keep = [os.path.normpath(os.path.join(base, name)) for name in KEEP[part]]
+        for root, dirs, files in os.walk(base, topdown=True):
+            dirs[:] = [d for d in dirs if os.path.normpath(os.path.join(root, d)) not in keep]
+            for name in files:
+                path = os.path.normpath(os.path.join(root, name))
+                if path not in written and path not in keep:
+                    os.remove(path)
+        for root, dirs, files in os.walk(base, topdown=False):
+            path = os.path.normpath(root)
+            if root != base and path not in written and path not in keep and not os.listdir(root):
+                os.rmdir(root)
+
+
+def fetch(source, cache_dir, offline=False, dest='.'):
+    """Bring PARTS of dest in line with source: a URL, a file:// URL, a tarball or a source directory."""
+    parsed = urlparse(source)
+    if parsed.scheme in ('http', 'https'):
+        written = extract(download(source, Cache(cache_dir), offline), dest)
+    else:
+        path = url2pathname(parsed.path) if parsed.scheme == 'file' else source
+        if os.path.isdir(path):
+            written = copy_tree(path, dest)
+        else:
+            written = extract(path, dest)
+    remove_stale(written, dest)
+
+
+def patch_pin_config(path="./src/config/pin_config.py"):
+    with open(path, 'r') as pin_config:
+        config = pin_config.read()
+    patched = config.replace("analog_pins = [5, 6, 7, 15, 16, 17, 18, 8, 3]  # Allowed ADC pins for pumps control",
+                             "analog_pins = [7, 15, 16, 17, 18, 8, 3]  # Allowed ADC pins for pumps control")
+    # Rewriting an already patched file would only bump its mtime
+    if patched != config:
+        with open(path, 'w') as pin_config:
+            pin_config.write(patched)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Fetch the upstream firmware sources into src, scripts and boards")
+    parser.add_argument('--tag', default=os.environ.get('SMARTDOSER_TAG', TAG))
+    parser.add_argument('--source', default=os.environ.get('SMARTDOSER_SOURCE'),
+                        help="archive URL, file:// URL, local tarball or source directory, default: the tag on GitHub")
+    parser.add_argument('--cache-dir', default=os.environ.get('SMARTDOSER_CACHE', CACHE_DIR))
+    parser.add_argument('--offline', action='store_true', help="use the cached archive, no network")
+    args = parser.parse_args()
+
+    fetch(args.source or URL.format(tag=args.tag), args.cache_dir, args.offline)
+    patch_pin_config()
@@ -0,0 +1,54 @@
+"""Host-side simulation of the controller board.
+
+install() makes src/ importable on CPython with simulated machine, utime
+and microdot/web modules, and switches the MicroPython time API to the
+virtual clock. See sim.run for running extension_tasks against scripted
+sensor waveforms.
+"""
+import builtins
+import os
+import sys
+import time
+
+from .clock import CLOCK
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC = os.path.join(ROOT, "src")
+MODULES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "modules")
+
+_saved_time = {}
+
+
+def install(clock=CLOCK):
+    for path in (SRC, MODULES):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+    # ads1x15 uses the MicroPython const() builtin
+    builtins.const = lambda value: value
+    patched = {
+        "time": clock.time,
+        "ticks_ms": clock.ticks_ms,
+        "ticks_us": clock.ticks_us,
+        "ticks_diff": lambda a, b: a - b,
+        "ticks_add": lambda a, b: a + b,
+        "sleep_ms": lambda ms: clock.advance(ms / 1000),
+        "sleep_us": lambda us: clock.advance(us / 1000000),
+    }
+    for name, value in patched.items():
+        if name not in _saved_time:
+            _saved_time[name] = getattr(time, name, None)
+        setattr(time, name, value)
+
+
+def uninstall():
+    for name, value in _saved_time.items():
+        if value is None:
+            delattr(time, name)
+        else:
+            setattr(time, name, value)
+    _saved_time.clear()
+    if hasattr(builtins, "const"):
+        del builtins.const
+    for path in (SRC, MODULES):
+        if path in sys.path:
+            sys.path.remove(path)
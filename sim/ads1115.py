@@ -0,0 +1,154 @@
+import asyncio
+
+from .clock import CLOCK
+
+_FULL_SCALE = (6.144, 4.096, 2.048, 1.024, 0.512, 0.256, 0.256, 0.256)
+_SPS_ADS1115 = (8, 16, 32, 64, 128, 250, 475, 860)
+_SPS_ADS1015 = (128, 250, 490, 920, 1600, 2400, 3300, 3300)
+# MUX field to (positive, negative) input, None is GND
+_MUX = ((0, 1), (0, 3), (1, 3), (2, 3), (0, None), (1, None), (2, None), (3, None))
+
+_REG_CONVERT = 0
+_REG_CONFIG = 1
+_REG_LOW = 2
+_REG_HIGH = 3
+
+
+class ADS1115Model:
+    """Register level ADS1115 model.
+
+    Conversions take 1/SPS of simulated time, the config OS bit reads busy
+    until then and the result is the input waveform sampled at the end of
+    the conversion. In continuous mode with the comparator enabled the
+    ALERT/RDY pin is driven once per conversion, either as a conversion
+    ready pulse or as a traditional/window comparator output.
+    """
+
+    sps_table = _SPS_ADS1115
+    bits = 16
+
+    def __init__(self, address=0x48, inputs=None, alert_pin=None):
+        self.address = address
+        self.inputs = inputs if inputs is not None else {}
+        self.alert_pin = alert_pin
+        self.config = 0x8583
+        self.low = 0x8000
+        self.high = 0x7FFF
+        self.ready_at = 0.0
+        self.started = 0.0
+        self.result = 0
+        self.conversions = 0
+        self.alert_active = False
+        self._handle = None
+
+    def set_input(self, channel, wave):
+        self.inputs[channel] = wave
+
+    @property
+    def continuous(self):
+        return not self.config & 0x0100
+
+    @property
+    def period(self):
+        return 1 / self.sps_table[(self.config >> 5) & 7]
+
+    def _volts(self, t):
+        pos, neg = _MUX[(self.config >> 12) & 7]
+        wave = self.inputs.get(pos)
+        v = wave(t) if wave else 0.0
+        if neg is not None:
+            wave = self.inputs.get(neg)
+            v -= wave(t) if wave else 0.0
+        return v
+
+    def _sample(self, t):
+        fs = _FULL_SCALE[(self.config >> 9) & 7]
+        raw = int(self._volts(t) / fs * 32768)
+        raw = max(-32768, min(32767, raw))
+        if self.bits == 12:
+            raw = (raw >> 4) << 4
+        self.conversions += 1
+        return raw & 0xFFFF
+
+    def write_register(self, register, value):
+        if register == _REG_CONFIG:
+            start = value & 0x8000
+            self.config = value & 0x7FFF
+            if self.continuous or start:
+                self.started = CLOCK.now
+                self.ready_at = CLOCK.now + self.period
+            self._schedule_alert()
+        elif register == _REG_LOW:
+            self.low = value
+        elif register == _REG_HIGH:
+            self.high = value
+
+    def read_register(self, register):
+        now = CLOCK.now
+        if register == _REG_CONFIG:
+            busy = not self.continuous and now < self.ready_at
+            return self.config | (0 if busy else 0x8000)
+        if register == _REG_CONVERT:
+            if self.continuous:
+                done = int((now - self.started) / self.period)
+                if done:
+                    self.result = self._sample(self.started + done * self.period)
+            elif now >= self.ready_at and self.ready_at > self.started:
+                self.result = self._sample(self.ready_at)
+                # Latch the single shot result
+                self.started = self.ready_at
+            if self.config & 0x0004:
+                self._set_alert(False)
+            return self.result
+        if register == _REG_LOW:
+            return self.low
+        return self.high
+
+    def _to_signed(self, value):
+        return value - 0x10000 if value & 0x8000 else value
+
+    def _set_alert(self, active):
+        self.alert_active = active
+        if self.alert_pin is not None:
+            active_high = self.config & 0x0008
+            self.alert_pin.drive(1 if active == bool(active_high) else 0)
+
+    def _schedule_alert(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        if self.alert_pin is None or not self.continuous or (self.config & 3) == 3:
+            self._set_alert(False)
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._handle = loop.call_at(self.ready_at, self._alert_tick, loop)
+
+    def _alert_tick(self, loop):
+        value = self._to_signed(self._sample(CLOCK.now))
+        self.result = value & 0xFFFF
+        high = self._to_signed(self.high)
+        low = self._to_signed(self.low)
+        if self.high & 0x8000 == 0x8000 and self.low & 0x8000 == 0:
+            # Conversion ready mode, pulse the pin
+            self._set_alert(True)
+            self._set_alert(False)
+        elif self.config & 0x0010:
+            if value > high or value < low:
+                self._set_alert(True)
+            elif not self.config & 0x0004:
+                self._set_alert(False)
+        else:
+            if value > high:
+                self._set_alert(True)
+            elif value < low and not self.config & 0x0004:
+                self._set_alert(False)
+        self.ready_at += self.period
+        self._handle = loop.call_at(self.ready_at, self._alert_tick, loop)
+
+
+class ADS1015Model(ADS1115Model):
+    sps_table = _SPS_ADS1015
+    bits = 12
@@ -0,0 +1,27 @@
+from .clock import CLOCK
+
+# Simulated wiring of the board: analog pin inputs and I2C devices by address
+analog = {}
+i2c_devices = {}
+
+
+def set_analog(pin, wave):
+    """Feed an ADC pin with a waveform, see sim.waveforms."""
+    analog[pin] = wave
+
+
+def add_i2c_device(device):
+    i2c_devices[device.address] = device
+    return device
+
+
+def analog_volts(pin):
+    wave = analog.get(pin)
+    if wave is None:
+        return 0.0
+    return wave(CLOCK.now)
+
+
+def reset():
+    analog.clear()
+    i2c_devices.clear()
@@ -0,0 +1,56 @@
+import asyncio
+import selectors
+
+# 2026-01-01 00:00:00 UTC, time.time() of the simulated board at start
+EPOCH = 1767225600
+
+
+class Clock:
+    """Virtual time shared by the simulated board and the event loop."""
+
+    def __init__(self, epoch=EPOCH):
+        self.epoch = epoch
+        self.now = 0.0
+
+    def advance(self, seconds):
+        if seconds > 0:
+            self.now += seconds
+
+    def time(self):
+        return self.epoch + int(self.now)
+
+    def ticks_ms(self):
+        return int(self.now * 1000)
+
+    def ticks_us(self):
+        return int(self.now * 1000000)
+
+
+CLOCK = Clock()
+
+
+class _VirtualSelector(selectors.SelectSelector):
+    # Instead of blocking until the next timer, jump the clock to it
+    def __init__(self, clock):
+        super().__init__()
+        self.clock = clock
+
+    def select(self, timeout=None):
+        ready = super().select(0)
+        if ready:
+            return ready
+        if timeout is None:
+            raise RuntimeError("Simulation is idle, nothing is scheduled")
+        self.clock.advance(timeout)
+        return []
+
+
+class VirtualLoop(asyncio.SelectorEventLoop):
+    """asyncio loop running on the virtual clock, sleeps take no wall time."""
+
+    def __init__(self, clock=CLOCK):
+        self.clock = clock
+        super().__init__(_VirtualSelector(clock))
+
+    def time(self):
+        return self.clock.now
@@ -0,0 +1,89 @@
+# Minimal in-process stand-in for microdot, routes are called directly
+import json
+
+
+class NoCaseDict(dict):
+    def __init__(self, items=None):
+        super().__init__()
+        for key, value in (items or {}).items():
+            self[key] = value
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key.lower(), value)
+
+    def __getitem__(self, key):
+        return super().__getitem__(key.lower())
+
+    def __contains__(self, key):
+        return super().__contains__(key.lower())
+
+    def get(self, key, default=None):
+        return super().get(key.lower(), default)
+
+
+class Request:
+    def __init__(self, method="GET", path="/", args=None, headers=None, json=None):
+        self.method = method
+        self.path = path
+        self.args = dict(args or {})
+        self.headers = NoCaseDict(headers)
+        self.json = json
+
+
+class Response:
+    def __init__(self, body="", status_code=200, headers=None, reason=None):
+        self.body = body
+        self.status_code = status_code
+        self.headers = NoCaseDict(headers)
+        self.cookies = {}
+
+    def set_cookie(self, cookie, value, path=None, domain=None, expires=None,
+                   max_age=None, secure=False, http_only=False):
+        self.cookies[cookie] = value
+
+    @classmethod
+    def send_file(cls, filename, status_code=200, content_type=None,
+                  stream=None, max_age=None, compressed=False,
+                  file_extension=''):
+        headers = {'Content-Type': content_type or 'text/html'}
+        if compressed:
+            headers['Content-Encoding'] = compressed if isinstance(compressed, str) else 'gzip'
+        # The file is opened lazily, pages are usually not on the host workdir
+        return cls(body=filename + file_extension, status_code=status_code, headers=headers)
+
+
+send_file = Response.send_file
+
+
+def _make_response(result):
+    if isinstance(result, Response):
+        return result
+    status, headers = 200, None
+    if isinstance(result, tuple):
+        if len(result) == 3:
+            result, status, headers = result
+        else:
+            result, status = result
+    if isinstance(result, (dict, list)):
+        result = json.dumps(result)
+        headers = dict(headers or {}, **{'Content-Type': 'application/json'})
+    return Response(result if result is not None else "", status, headers)
+
+
+class Microdot:
+    def __init__(self):
+        self.routes = {}
+
+    def route(self, url_pattern, methods=None):
+        def decorator(f):
+            for method in methods or ['GET']:
+                self.routes[(method, url_pattern)] = f
+            return f
+        return decorator
+
+    async def request(self, method, path, args=None, headers=None, json=None):
+        """Dispatch like the server would and return a Response."""
+        handler = self.routes.get((method, path))
+        if handler is None:
+            return Response("Not found", 404)
+        return _make_response(await handler(Request(method, path, args, headers, json)))
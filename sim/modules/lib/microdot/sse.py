@@ -0,0 +1,45 @@
+import asyncio
+import json
+
+from .microdot import Response
+
+
+class SSE:
+    def __init__(self):
+        self.event = asyncio.Event()
+        self.queue = []
+        self.task = None
+
+    async def send(self, data, event=None, event_id=None):
+        if isinstance(data, (dict, list)):
+            data = json.dumps(data).encode()
+        elif isinstance(data, str):
+            data = data.encode()
+        elif not isinstance(data, bytes):
+            data = str(data).encode()
+        data = b'data: ' + data + b'\n\n'
+        if event_id:
+            data = b'id: ' + event_id.encode() + b'\n' + data
+        if event:
+            data = b'event: ' + event.encode() + b'\n' + data
+        self.queue.append(data)
+        self.event.set()
+
+    def frames(self):
+        """Pop everything sent so far, oldest first."""
+        frames = self.queue[:]
+        self.queue.clear()
+        return frames
+
+    def close(self):
+        # What the server does when the client goes away
+        if self.task is not None:
+            self.task.cancel()
+
+
+def with_sse(f):
+    async def sse_handler(request, *args, **kwargs):
+        sse = SSE()
+        sse.task = asyncio.create_task(f(request, sse, *args, **kwargs))
+        return Response(body=sse, headers={'Content-Type': 'text/event-stream'})
+    return sse_handler
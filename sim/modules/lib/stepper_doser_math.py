@@ -0,0 +1,9 @@
+import numpy as np
+
+
+def linear_interpolation(data, num_points=20):
+    points = sorted((d['ph'], d['adc']) for d in data.values())
+    merged = []
+    for (x0, y0), (x1, y1) in zip(points, points[1:]):
+        merged.extend(zip(np.linspace(x0, x1, num=num_points), np.linspace(y0, y1, num=num_points)))
+    return merged
@@ -0,0 +1,140 @@
+# Simulated MicroPython machine module, see sim.board for the wiring
+from sim import board
+from sim.clock import CLOCK
+
+
+class _PinState:
+    def __init__(self):
+        self.mode = None
+        self.level = 0
+        self.handler = None
+        self.trigger = 0
+
+
+class Pin:
+    IN = 1
+    OUT = 3
+    OPEN_DRAIN = 7
+    PULL_DOWN = 1
+    PULL_UP = 2
+    IRQ_RISING = 1
+    IRQ_FALLING = 2
+
+    # Pin objects with the same id share the pad, like on the board
+    _states = {}
+
+    def __init__(self, id, mode=-1, pull=-1, value=None):
+        self.id = id
+        self._state = Pin._states.setdefault(id, _PinState())
+        self.init(mode, pull, value)
+
+    def init(self, mode=-1, pull=-1, value=None):
+        if mode != -1:
+            self._state.mode = mode
+        if pull == Pin.PULL_UP:
+            self._state.level = 1
+        if value is not None:
+            self._state.level = 1 if value else 0
+
+    def value(self, v=None):
+        if v is None:
+            return self._state.level
+        self._state.level = 1 if v else 0
+
+    def on(self):
+        self.value(1)
+
+    def off(self):
+        self.value(0)
+
+    def irq(self, handler=None, trigger=IRQ_RISING | IRQ_FALLING, hard=False):
+        self._state.handler = handler
+        self._state.trigger = trigger
+
+    def drive(self, v):
+        """Change the level from outside, as the wired sensor would."""
+        state = self._state
+        old = state.level
+        state.level = 1 if v else 0
+        if state.handler is None or old == state.level:
+            return
+        edge = Pin.IRQ_RISING if state.level else Pin.IRQ_FALLING
+        if state.trigger & edge:
+            state.handler(self)
+
+    @classmethod
+    def reset(cls):
+        cls._states.clear()
+
+
+class ADC:
+    ATTN_0DB = 0
+    ATTN_2_5DB = 1
+    ATTN_6DB = 2
+    ATTN_11DB = 3
+    WIDTH_12BIT = 3
+
+    def __init__(self, pin, atten=ATTN_11DB):
+        self.pin = pin.id if isinstance(pin, Pin) else pin
+        self.reads = 0
+
+    def atten(self, atten):
+        pass
+
+    def width(self, width):
+        pass
+
+    def read_uv(self):
+        self.reads += 1
+        return int(max(0.0, min(3.3, board.analog_volts(self.pin))) * 1000000)
+
+    def read(self):
+        return min(4095, self.read_uv() * 4096 // 3300000)
+
+    def read_u16(self):
+        return min(65535, self.read_uv() * 65536 // 3300000)
+
+
+class I2C:
+    def __init__(self, id=0, scl=None, sda=None, freq=400000):
+        self.freq = freq
+        self.transactions = 0
+
+    def _device(self, addr):
+        device = board.i2c_devices.get(addr)
+        if device is None:
+            raise OSError(19)  # ENODEV
+        return device
+
+    def _bus_time(self, nbytes):
+        # Address, register and data bytes, 9 clocks each
+        self.transactions += 1
+        CLOCK.advance((3 + nbytes) * 9 / self.freq)
+
+    def scan(self):
+        return sorted(board.i2c_devices)
+
+    def writeto_mem(self, addr, memaddr, buf, addrsize=8):
+        device = self._device(addr)
+        self._bus_time(len(buf))
+        device.write_register(memaddr, (buf[0] << 8) | buf[1])
+
+    def readfrom_mem_into(self, addr, memaddr, buf, addrsize=8):
+        device = self._device(addr)
+        self._bus_time(len(buf))
+        value = device.read_register(memaddr)
+        buf[0] = value >> 8
+        buf[1] = value & 0xFF
+
+    def readfrom_mem(self, addr, memaddr, nbytes, addrsize=8):
+        buf = bytearray(nbytes)
+        self.readfrom_mem_into(addr, memaddr, buf)
+        return bytes(buf)
+
+
+def freq(hz=None):
+    return 240000000
+
+
+def reset():
+    raise SystemExit("machine.reset()")
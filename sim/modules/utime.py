@@ -0,0 +1,34 @@
+# Simulated MicroPython utime module running on the virtual clock
+from sim.clock import CLOCK
+
+
+def time():
+    return CLOCK.time()
+
+
+def ticks_ms():
+    return CLOCK.ticks_ms()
+
+
+def ticks_us():
+    return CLOCK.ticks_us()
+
+
+def ticks_diff(a, b):
+    return a - b
+
+
+def ticks_add(a, b):
+    return a + b
+
+
+def sleep(seconds):
+    CLOCK.advance(seconds)
+
+
+def sleep_ms(ms):
+    CLOCK.advance(ms / 1000)
+
+
+def sleep_us(us):
+    CLOCK.advance(us / 1000000)
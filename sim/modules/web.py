@@ -0,0 +1,16 @@
+# Stand-in for the upstream web module the extension plugs into
+from lib.microdot.microdot import Microdot
+
+app = Microdot()
+storage = {"pump1": 0, "remaining1": 0}
+color = "cyan"
+theme = "dark"
+timeformat = "0"
+timezone = 0.0
+schedule = []
+schedule_updates = 0
+
+
+def update_schedule(data):
+    global schedule_updates
+    schedule_updates += 1
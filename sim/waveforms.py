@@ -0,0 +1,39 @@
+import math
+import random
+
+# Waveforms are functions of the simulated time in seconds returning volts
+
+
+def constant(volts):
+    def wave(t):
+        return volts
+    return wave
+
+
+def sine(offset, amplitude, period):
+    def wave(t):
+        return offset + amplitude * math.sin(2 * math.pi * t / period)
+    return wave
+
+
+def scripted(points):
+    """Piecewise linear through (time, volts) points, held at both ends."""
+    points = sorted(points)
+
+    def wave(t):
+        if t <= points[0][0]:
+            return points[0][1]
+        for (t0, v0), (t1, v1) in zip(points, points[1:]):
+            if t <= t1:
+                return v0 + (v1 - v0) * (t - t0) / (t1 - t0)
+        return points[-1][1]
+    return wave
+
+
+def noisy(wave, sigma, seed=0):
+    """Add gaussian noise, the same seed gives the same samples."""
+    rnd = random.Random(seed)
+
+    def noisy_wave(t):
+        return wave(t) + rnd.gauss(0, sigma)
+    return noisy_wave
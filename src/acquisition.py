@@ -0,0 +1,217 @@
+from array import array
+
+try:
+    from ulab import numpy as np
+except ImportError:
+    try:
+        import numpy as np
+    except ImportError:
+        np = None
+
+import log
+import metrics
+from compat import RETRY_MS, ticks_add, ticks_diff, ticks_ms, sleep_ms as _sleep_ms
+
+FILTERS = ("mean", "median")
+# Sums of this many int16 samples are still exact in float32
+EXACT_SUM = 512
+
+
+class AcqProfile:
+    """Oversampling settings of one channel.
+
+    rate is the ADS1x15 rate index, block samples are collected per burst
+    and every decimation of them are filtered into one output value, so a
+    burst gives block // decimation values. interval_ms is the time from
+    one burst start to the next, 0 collects back to back.
+    """
+
+    def __init__(self, rate=6, block=64, decimation=16, filter="mean", interval_ms=0):
+        if block % decimation:
+            raise ValueError("Block size must be a multiple of the decimation factor")
+        if filter not in FILTERS:
+            raise ValueError("Unknown decimation filter: %s" % filter)
+        self.rate = rate
+        self.block = block
+        self.decimation = decimation
+        self.filter = filter
+        self.interval_ms = interval_ms
+
+    @property
+    def outputs(self):
+        return self.block // self.decimation
+
+
+class Oversampler:
+    """Continuous mode acquisition of one ADS1x15 channel.
+
+    The chip runs in conversion_start() mode, each burst reads profile.block
+    results into a preallocated int16 buffer and decimates it with one
+    vectorized reshape plus mean/median, falling back to plain Python
+    without ulab/numpy. Decimated values go to consumer(ticks_ms, volts).
+
+    The chip is taken over by the channel, it can't also be scanned by a
+    ScanScheduler, but a shared bus lock is held for every read. With a
+    ThresholdAlert on the same channel the alert starts the conversions,
+    so the comparator watches the samples that are collected here.
+
+    Instead of run(), a SampleWorker can read the chip in its own thread
+    with conversion_start() as setup and alert_read() as sample, and
+    feed() the results back here to be decimated.
+
+    With fixed=True the consumer gets microvolts as ints, the blocks are
+    reduced to exact integer sums before the scaling.
+    """
+
+    def __init__(self, adc, channel1=0, channel2=None, profile=None, consumer=None, lock=None,
+                 alert=None, fixed=False):
+        self.adc = adc
+        self.channel1 = channel1
+        self.channel2 = channel2
+        self.profile = profile if profile is not None else AcqProfile()
+        self.consumer = consumer
+        self.lock = lock
+        self.alert = alert
+        self.value = None
+        self.bursts = 0
+        self.fill = 0
+        self._fill_start = 0
+        self.errors = 0
+        self.fixed = fixed
+        self.buffer = array('h', [0] * self.profile.block)
+        self._np_buffer = np.frombuffer(self.buffer, dtype=np.int16) if np is not None else None
+        # Float copy of the block for the fixed point sums
+        self._np_float = np.zeros(self.profile.block) if np is not None and fixed else None
+        self._uv = array('l', [0] * self.profile.outputs)
+        # Volts per raw count
+        self._scale = adc.raw_to_v(1)
+
+    def decimate_uv(self):
+        """Integer decimate(), returns profile.outputs values in microvolts."""
+        profile = self.profile
+        buf = self.buffer
+        n = profile.decimation
+        out = self._uv
+        if self._np_float is not None and n <= EXACT_SUM:
+            # Vectorized sums of n samples, or of the 2 middle ones for the
+            # median, are exact integers in float, only the scaling to
+            # microvolts is per value
+            if profile.filter == "median":
+                sums = np.median(self._np_buffer.reshape((profile.outputs, n)), axis=1) * 2
+                n = 2
+            else:
+                floats = self._np_float
+                floats[:] = self._np_buffer
+                sums = np.sum(floats.reshape((profile.outputs, n)), axis=1)
+            for k in range(profile.outputs):
+                out[k] = self.adc.raw_to_uv(int(round(sums[k])), n)
+            return out
+        for k in range(profile.outputs):
+            start = k * n
+            if profile.filter == "median":
+                group = sorted(buf[start:start + n])
+                out[k] = self.adc.raw_to_uv(group[(n - 1) >> 1] + group[n >> 1], 2)
+            else:
+                total = 0
+                for i in range(start, start + n):
+                    total += buf[i]
+                out[k] = self.adc.raw_to_uv(total, n)
+        return out
+
+    def decimate(self):
+        """Filter the collected block, returns profile.outputs values in volts (microvolts if fixed)."""
+        profile = self.profile
+        if self.fixed:
+            return self.decimate_uv()
+        if self._np_buffer is not None:
+            blocks = self._np_buffer.reshape((profile.outputs, profile.decimation))
+            if profile.filter == "median":
+                return np.median(blocks, axis=1) * self._scale
+            return np.mean(blocks, axis=1) * self._scale
+        out = []
+        buf = self.buffer
+        n = profile.decimation
+        for i in range(0, profile.block, n):
+            group = buf[i:i + n]
+            if profile.filter == "median":
+                group = sorted(group)
+                value = (group[(n - 1) // 2] + group[n // 2]) / 2
+            else:
+                value = sum(group) / n
+            out.append(value * self._scale)
+        return out
+
+    def conversion_start(self):
+        if self.alert is not None:
+            self.alert.start()
+        else:
+            self.adc.conversion_start(self.profile.rate, self.channel1, self.channel2)
+
+    async def _start(self):
+        if self.lock is None:
+            return self.conversion_start()
+        async with self.lock:
+            return self.conversion_start()
+
+    def _timed_read(self):
+        start = metrics.ticks_us()
+        raw = self.adc.alert_read()
+        metrics.record("io", "oversampler", start)
+        return raw
+
+    async def _read(self):
+        if self.lock is None:
+            return self._timed_read()
+        async with self.lock:
+            return self._timed_read()
+
+    async def collect(self):
+        """Read one block of continuous conversion results, paced at the data rate."""
+        buf = self.buffer
+        # Rounded up, a read ahead of the data rate gets the same conversion twice
+        period = -(-1000 // self.adc.sample_rate(self.profile.rate))
+        for i in range(len(buf)):
+            await _sleep_ms(period)
+            buf[i] = await self._read()
+
+    def _emit(self, start, elapsed):
+        values = self.decimate()
+        self.bursts += 1
+        outputs = self.profile.outputs
+        # Output values are spread over the burst they were taken in
+        step = elapsed // outputs
+        for i in range(outputs):
+            self.value = values[i] if self.fixed else float(values[i])
+            if self.consumer is not None:
+                self.consumer(ticks_add(start, i * step), self.value)
+
+    def feed(self, ticks, raw):
+        """Add one raw result read elsewhere, every full block is decimated."""
+        if self.fill == 0:
+            self._fill_start = ticks
+        self.buffer[self.fill] = raw
+        self.fill += 1
+        if self.fill == len(self.buffer):
+            self.fill = 0
+            self._emit(self._fill_start, ticks_diff(ticks, self._fill_start))
+
+    async def run(self):
+        profile = self.profile
+        started = False
+        while True:
+            start = ticks_ms()
+            try:
+                if not started:
+                    await self._start()
+                    started = True
+                await self.collect()
+            except OSError as e:
+                self.errors += 1
+                started = False
+                log.error("ADC acquisition error at address 0x%x: %s", self.adc.address, e)
+                await _sleep_ms(RETRY_MS)
+                continue
+            self._emit(start, ticks_diff(ticks_ms(), start))
+            left = profile.interval_ms - ticks_diff(ticks_ms(), start)
+            if left > 0:
+                await _sleep_ms(left)
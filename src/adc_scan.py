@@ -0,0 +1,105 @@
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+import metrics
+import log
+from compat import RETRY_MS, ticks_add, ticks_diff, ticks_ms, sleep_ms as _sleep_ms
+
+
+class ScanChannel:
+    """One input of a scanned ADC, samples go to consumer(ticks_ms, volts)."""
+
+    def __init__(self, channel1, channel2, rate, consumer):
+        self.channel1 = channel1
+        self.channel2 = channel2
+        self.rate = rate
+        self.consumer = consumer
+        self.value = None
+        self.ticks = 0
+        self.count = 0
+
+
+class _Device:
+    def __init__(self, adc):
+        self.adc = adc
+        self.channels = []
+        # Channel whose conversion is running, -1 before the first one
+        self.index = -1
+        self.started = 0
+        self.due = 0
+        self.errors = 0
+
+
+class ScanScheduler:
+    """Round robin scan of several ADS1x15 chips on one I2C bus.
+
+    Each chip converts on its own, the scheduler only holds the bus lock to
+    read a finished result and start the next channel in the same access
+    (set_conv()/read_rev()), so the chips convert in parallel and the
+    aggregate sample rate grows with their number. Samples are stamped
+    with the conversion start time.
+
+    period_ms is the minimum time between conversions on one chip, 0 scans
+    back to back at the channel rate.
+    """
+
+    def __init__(self, lock=None, period_ms=0):
+        self.lock = lock if lock is not None else asyncio.Lock()
+        self.period_ms = period_ms
+        self.devices = []
+        self.samples = 0
+
+    def add(self, adc, channel1=0, channel2=None, rate=4, consumer=None):
+        for dev in self.devices:
+            if dev.adc is adc:
+                break
+        else:
+            dev = _Device(adc)
+            self.devices.append(dev)
+        channel = ScanChannel(channel1, channel2, rate, consumer)
+        dev.channels.append(channel)
+        return channel
+
+    def _step(self, dev):
+        # Read the finished conversion and start the next channel
+        adc = dev.adc
+        nxt = (dev.index + 1) % len(dev.channels)
+        channel = dev.channels[nxt]
+        start = metrics.ticks_us()
+        adc.set_conv(channel.rate, channel.channel1, channel.channel2)
+        raw = adc.read_rev()
+        metrics.record("io", "adc_scan", start)
+        now = ticks_ms()
+        if dev.index >= 0:
+            done = dev.channels[dev.index]
+            done.value = adc.raw_to_v(raw)
+            done.ticks = dev.started
+            done.count += 1
+            self.samples += 1
+            if done.consumer is not None:
+                done.consumer(done.ticks, done.value)
+        dev.index = nxt
+        dev.started = now
+        dev.due = ticks_add(now, max(adc.conversion_ms(channel.rate), self.period_ms))
+
+    async def run(self):
+        while True:
+            if not self.devices:
+                await _sleep_ms(RETRY_MS)
+                continue
+            async with self.lock:
+                for dev in self.devices:
+                    if ticks_diff(dev.due, ticks_ms()) > 0:
+                        continue
+                    try:
+                        self._step(dev)
+                    except OSError as e:
+                        dev.errors += 1
+                        dev.index = -1
+                        dev.due = ticks_add(ticks_ms(), RETRY_MS)
+                        log.error("ADC scan error at address 0x%x: %s", dev.adc.address, e)
+                now = ticks_ms()
+                wait = min(ticks_diff(dev.due, now) for dev in self.devices)
+            await _sleep_ms(max(wait, 0))
@@ -23,6 +23,14 @@
 #
 import utime as time
 
+try:
+    from micropython import const
+except ImportError:
+    def const(value):
+        return value
+
+from compat import ThreadSafeFlag, sleep_ms as _sleep_ms
+
 _REGISTER_MASK = const(0x03)
 _REGISTER_CONVERT = const(0x00)
 _REGISTER_CONFIG = const(0x01)
@@ -103,6 +111,16 @@ _GAINS_V = (
     0.256  # 16x
 )
 
+# LSB size of each gain in 1/16 uV, integer conversion stays in small ints
+_GAINS_UV16 = (
+    3000,  # 2/3x, 187.5uV
+    2000,  # 1x, 125uV
+    1000,  # 2x
+    500,  # 4x
+    250,  # 8x
+    125  # 16x, 7.8125uV
+)
+
 _CHANNELS = {
     (0, None): _MUX_SINGLE_0,
     (1, None): _MUX_SINGLE_1,
@@ -125,33 +143,84 @@ _RATES = (
     _DR_860SPS    # - /860 samples per Second
 )
 
+_CQUES = (
+    _CQUE_1CONV,
+    _CQUE_2CONV,
+    _CQUE_4CONV
+)
+
+# Samples per second for each _RATES entry
+_SPS_ADS1115 = (8, 16, 32, 64, 128, 250, 475, 860)
+_SPS_ADS1015 = (128, 250, 490, 920, 1600, 2400, 3300, 3300)
+
 
 class ADS1115:
+    _SPS = _SPS_ADS1115
+
     def __init__(self, i2c, address=0x48, gain=1):
         self.i2c = i2c
         self.address = address
         self.gain = gain
         self.temp2 = bytearray(2)
+        self.mode = None
+        self._conv_ms = 0
+        self._conv_start = 0
+        self._ready = None
+        # I2C transaction counters
+        self.i2c_reads = 0
+        self.i2c_writes = 0
 
     def _write_register(self, register, value):
         self.temp2[0] = value >> 8
         self.temp2[1] = value & 0xff
         self.i2c.writeto_mem(self.address, register, self.temp2)
+        self.i2c_writes += 1
 
     def _read_register(self, register):
         self.i2c.readfrom_mem_into(self.address, register, self.temp2)
+        self.i2c_reads += 1
         return (self.temp2[0] << 8) | self.temp2[1]
 
+    @property
+    def i2c_transactions(self):
+        return self.i2c_reads + self.i2c_writes
+
+    def reset_counters(self):
+        self.i2c_reads = 0
+        self.i2c_writes = 0
+
+    def sample_rate(self, rate=4):
+        """Samples per second of a rate index."""
+        return self._SPS[rate]
+
+    def conversion_ms(self, rate=4):
+        """Conversion time for the rate, rounded up with 1ms margin."""
+        sps = self._SPS[rate]
+        return (1000 + sps - 1) // sps + 1
+
     def raw_to_v(self, raw):
         v_p_b = _GAINS_V[self.gain] / 32768
         return raw * v_p_b
 
+    def raw_to_uv(self, raw, n=1):
+        """Integer microvolts of a raw reading, or the mean of n readings summed
+           in raw, rounded. Stays in small ints, no float is allocated."""
+        lsb = _GAINS_UV16[self.gain]
+        q = raw // n
+        return (q * lsb + (raw - q * n) * lsb // n + 8) >> 4
+
+    def v_to_raw(self, v):
+        """Raw reading of a voltage, clamped to the range of the gain."""
+        raw = int(v * 32768 / _GAINS_V[self.gain])
+        return max(-32768, min(32767, raw))
+
     def set_conv(self, rate=4, channel1=0, channel2=None):
         """Set mode for read_rev"""
         self.mode = (_CQUE_NONE | _CLAT_NONLAT |
                      _CPOL_ACTVLOW | _CMODE_TRAD | _RATES[rate] |
                      _MODE_SINGLE | _OS_SINGLE | _GAINS[self.gain] |
                      _CHANNELS[(channel1, channel2)])
+        self._conv_ms = self.conversion_ms(rate)
 
     def read(self, rate=4, channel1=0, channel2=None):
         """Read voltage between a channel and GND.
@@ -170,21 +239,51 @@ class ADS1115:
            the next conversion."""
         res = self._read_register(_REGISTER_CONVERT)
         self._write_register(_REGISTER_CONFIG, self.mode)
+        self._conv_start = time.ticks_ms()
         return res if res < 32768 else res - 65536
 
-    def alert_start(self, rate=4, channel1=0, channel2=None,
-                    threshold_high=0x4000, threshold_low=0, latched=False) :
-        """Start continuous measurement, set ALERT pin on threshold."""
-        self._write_register(_REGISTER_LOWTHRESH, threshold_low)
-        self._write_register(_REGISTER_HITHRESH, threshold_high)
-        self._write_register(_REGISTER_CONFIG, _CQUE_1CONV |
-                             _CLAT_LATCH if latched else _CLAT_NONLAT |
+    async def read_async(self, rate=4, channel1=0, channel2=None):
+        """Read voltage between a channel and GND without blocking the loop.
+           Sleeps for the conversion time of the rate instead of polling,
+           so a read normally costs three I2C transactions."""
+        self._write_register(_REGISTER_CONFIG, (_CQUE_NONE | _CLAT_NONLAT |
                              _CPOL_ACTVLOW | _CMODE_TRAD | _RATES[rate] |
-                             _MODE_CONTIN | _GAINS[self.gain] |
+                             _MODE_SINGLE | _OS_SINGLE | _GAINS[self.gain] |
+                             _CHANNELS[(channel1, channel2)]))
+        await _sleep_ms(self.conversion_ms(rate))
+        while not self._read_register(_REGISTER_CONFIG) & _OS_NOTBUSY:
+            await _sleep_ms(1)
+        res = self._read_register(_REGISTER_CONVERT)
+        return res if res < 32768 else res - 65536
+
+    async def read_rev_async(self):
+        """Async read_rev, waits only for what is left of the conversion
+           started by the previous call. Call set_conv first."""
+        left = self._conv_ms - time.ticks_diff(time.ticks_ms(), self._conv_start)
+        if left > 0:
+            await _sleep_ms(left)
+        return self.read_rev()
+
+    def alert_start(self, rate=4, channel1=0, channel2=None,
+                    threshold_high=0x4000, threshold_low=0, latched=False,
+                    window=False, queue=0):
+        """Start continuous measurement, set ALERT pin on threshold.
+           window asserts ALERT outside [low, high] instead of above high
+           with hysteresis down to low, queue 0/1/2 asserts it after
+           1/2/4 conversions past the threshold."""
+        self._conv_ms = self.conversion_ms(rate)
+        self._write_register(_REGISTER_LOWTHRESH, threshold_low & 0xFFFF)
+        self._write_register(_REGISTER_HITHRESH, threshold_high & 0xFFFF)
+        self._write_register(_REGISTER_CONFIG, _CQUES[queue] |
+                             (_CLAT_LATCH if latched else _CLAT_NONLAT) |
+                             _CPOL_ACTVLOW |
+                             (_CMODE_WINDOW if window else _CMODE_TRAD) |
+                             _RATES[rate] | _MODE_CONTIN | _GAINS[self.gain] |
                              _CHANNELS[(channel1, channel2)])
 
     def conversion_start(self, rate=4, channel1=0, channel2=None):
         """Start continuous measurement, trigger on ALERT/RDY pin."""
+        self._conv_ms = self.conversion_ms(rate)
         self._write_register(_REGISTER_LOWTHRESH, 0)
         self._write_register(_REGISTER_HITHRESH, 0x8000)
         self._write_register(_REGISTER_CONFIG, _CQUE_1CONV | _CLAT_NONLAT |
@@ -197,6 +296,25 @@ class ADS1115:
         res = self._read_register(_REGISTER_CONVERT)
         return res if res < 32768 else res - 65536
 
+    def attach_ready_pin(self, pin, trigger):
+        """Wake alert_read_async from the ALERT/RDY pin interrupt.
+           trigger is Pin.IRQ_FALLING for the default active low polarity."""
+        self._ready = ThreadSafeFlag()
+        pin.irq(handler=self._ready_irq, trigger=trigger)
+
+    def _ready_irq(self, pin):
+        self._ready.set()
+
+    async def alert_read_async(self):
+        """Wait for the next conversion_start() result and read it.
+           Without a ready pin waits for one conversion period."""
+        if self._ready is None:
+            await _sleep_ms(self._conv_ms)
+        else:
+            await self._ready.wait()
+            self._ready.clear()
+        return self.alert_read()
+
 
 class ADS1113(ADS1115):
     def __init__(self, i2c, address=0x48):
@@ -208,8 +326,13 @@ class ADS1113(ADS1115):
     def read(self, rate=4):
         return super().read(rate, 0, 1)
 
-    def alert_start(self, rate=4, threshold_high=0x4000, threshold_low=0, latched=False):
-        return super().alert_start(rate, 0, 1, threshold_high, threshold_low, latched)
+    async def read_async(self, rate=4):
+        return await super().read_async(rate, 0, 1)
+
+    def alert_start(self, rate=4, threshold_high=0x4000, threshold_low=0, latched=False,
+                    window=False, queue=0):
+        return super().alert_start(rate, 0, 1, threshold_high, threshold_low, latched,
+                                   window, queue)
 
     def alert_read(self):
         return super().alert_read()
@@ -225,28 +348,48 @@ class ADS1114(ADS1115):
     def read(self, rate=4):
         return super().read(rate, 0, 1)
 
-    def alert_start(self, rate=4, threshold_high=0x4000, threshold_low=0, latched=False):
+    async def read_async(self, rate=4):
+        return await super().read_async(rate, 0, 1)
+
+    def alert_start(self, rate=4, threshold_high=0x4000, threshold_low=0, latched=False,
+                    window=False, queue=0):
         return super().alert_start(rate, 0, 1, threshold_high,
-            threshold_low, latched)
+            threshold_low, latched, window, queue)
 
     def alert_read(self):
         return super().alert_read()
 
 
 class ADS1015(ADS1115):
+    _SPS = _SPS_ADS1015
+
     def __init__(self, i2c, address=0x48, gain=1):
         super().__init__(i2c, address, gain)
 
     def raw_to_v(self, raw):
         return super().raw_to_v(raw << 4)
 
+    def raw_to_uv(self, raw, n=1):
+        return super().raw_to_uv(raw << 4, n)
+
+    def v_to_raw(self, v):
+        return super().v_to_raw(v) >> 4
+
     def read(self, rate=4, channel1=0, channel2=None):
         return super().read(rate, channel1, channel2) >> 4
 
+    async def read_async(self, rate=4, channel1=0, channel2=None):
+        return (await super().read_async(rate, channel1, channel2)) >> 4
+
+    def read_rev(self):
+        return super().read_rev() >> 4
+
     def alert_start(self, rate=4, channel1=0, channel2=None, threshold_high=0x400,
-        threshold_low=0, latched=False):
+        threshold_low=0, latched=False, window=False, queue=0):
         return super().alert_start(rate, channel1, channel2, threshold_high << 4,
-            threshold_low << 4, latched)
+            threshold_low << 4, latched, window, queue)
 
     def alert_read(self):
         return super().alert_read() >> 4
+
+    # alert_read_async() reads through alert_read(), already shifted
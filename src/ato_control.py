@@ -0,0 +1,95 @@
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+import metrics
+import log
+from compat import ThreadSafeFlag, ticks_add, ticks_diff, ticks_ms
+
+
+class AtoController:
+    """Event driven ATO pump control.
+
+    The float sensor interrupt switches the pump off right in the handler
+    and wakes the controller task, a run is also ended by a single deadline
+    timer armed in start() and by check_tds() called from the sampler.
+    While the pump is off the task just waits on its flag.
+    """
+
+    def __init__(self, pump, float_sensor, trigger, timeout=300, tds_limit=0.5):
+        self.pump = pump
+        self.float_sensor = float_sensor
+        self.timeout_ms = timeout * 1000
+        self.tds_limit = tds_limit
+        self.running = False
+        self.deadline = 0
+        self.started = 0
+        self.stopped = 0
+        self.stop_reason = None
+        self._wake = ThreadSafeFlag()
+        self.pump.value(0)
+        float_sensor.irq(handler=self._float_irq, trigger=trigger)
+
+    def _float_irq(self, pin):
+        if self.running:
+            self.pump.value(0)
+            self.running = False
+            self.stopped = ticks_ms()
+            self.stop_reason = "float"
+            self._wake.set()
+
+    def start(self, tds=None):
+        """Start a run unless the water level is high or tds, the last reading, is over the limit."""
+        if self.float_sensor.value():
+            log.info("ATO: water level is high, skip")
+            return False
+        if tds is not None and tds >= self.tds_limit:
+            log.warning("ATO: TDS %s over the limit, skip", tds)
+            return False
+        self.started = ticks_ms()
+        self.deadline = ticks_add(self.started, self.timeout_ms)
+        self.running = True
+        self.pump.value(1)
+        self._wake.set()
+        return True
+
+    def stop(self, reason):
+        self.pump.value(0)
+        if self.running:
+            self.running = False
+            self.stopped = ticks_ms()
+            self.stop_reason = reason
+            self._wake.set()
+
+    def check_tds(self, tds):
+        if self.running and tds is not None and tds >= self.tds_limit:
+            self.stop("tds")
+
+    async def _wait(self, timeout_ms=None):
+        try:
+            if timeout_ms is None:
+                await self._wake.wait()
+            else:
+                await asyncio.wait_for(self._wake.wait(), timeout_ms / 1000)
+        except asyncio.TimeoutError:
+            pass
+        if hasattr(self._wake, "clear"):
+            self._wake.clear()
+
+    async def run(self):
+        while True:
+            if not self.running:
+                if self.stop_reason:
+                    # Time from the stop (e.g. the float interrupt) until the task ran
+                    metrics.histogram("late", "ato_stop").add(ticks_diff(ticks_ms(), self.stopped) * 1000)
+                    log.info("ATO stopped: %s", self.stop_reason)
+                    self.stop_reason = None
+                await self._wait()
+                continue
+            left = ticks_diff(self.deadline, ticks_ms())
+            if left <= 0:
+                metrics.histogram("late", "ato_deadline").add(-left * 1000)
+                self.stop("timeout")
+                continue
+            await self._wait(left)
@@ -0,0 +1,54 @@
+import gc
+import json
+
+from compat import ticks_diff, ticks_us
+
+
+def _mem_alloc():
+    return gc.mem_alloc() if hasattr(gc, "mem_alloc") else None
+
+
+# (name, us, heap allocated after the step), in boot order
+steps = []
+_last = ticks_us()
+
+
+def add(name, us, alloc=None):
+    steps.append((name, us, alloc))
+
+
+def add_steps(boot_steps):
+    """Steps timed by boot.py before this module could be imported, (name, ms, mem_alloc)."""
+    for name, ms, alloc in boot_steps:
+        add(name, ms * 1000, alloc)
+
+
+def mark(name):
+    """Record the time since the previous mark as one step."""
+    global _last
+    now = ticks_us()
+    add(name, ticks_diff(now, _last), _mem_alloc())
+    _last = now
+
+
+def imports(names):
+    """Import modules one by one as separate steps, later imports of them are cache hits."""
+    for name in names:
+        try:
+            __import__(name)
+        except ImportError:
+            pass
+        mark("import " + name)
+
+
+def as_json():
+    total = 0
+    prev = None
+    out = []
+    for name, us, alloc in steps:
+        total += us
+        heap = alloc - prev if alloc is not None and prev is not None else None
+        if alloc is not None:
+            prev = alloc
+        out.append({"step": name, "us": us, "heap": heap})
+    return json.dumps({"total_us": total, "steps": out})
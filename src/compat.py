@@ -0,0 +1,85 @@
+"""MicroPython time and asyncio APIs with CPython fallbacks.
+
+The extension modules import these instead of each carrying its own
+fallback, so the host tools and the simulator run the same code paths.
+"""
+import time
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+# A device that failed on the bus is retried after this long
+RETRY_MS = 5000
+
+try:
+    ticks_ms = time.ticks_ms
+    ticks_us = time.ticks_us
+    ticks_diff = time.ticks_diff
+    ticks_add = time.ticks_add
+except AttributeError:
+    def ticks_ms():
+        return int(time.monotonic() * 1000)
+
+    def ticks_us():
+        return int(time.monotonic() * 1000000)
+
+    def ticks_diff(a, b):
+        return a - b
+
+    def ticks_add(a, b):
+        return a + b
+
+# Blocking sleeps for threads. On the ESP32 port sleep_us busy-waits
+# holding the GIL, sleep_ms releases it
+try:
+    thread_sleep_ms = time.sleep_ms
+    thread_sleep_us = time.sleep_us
+except AttributeError:
+    def thread_sleep_ms(ms):
+        time.sleep(ms / 1000)
+
+    def thread_sleep_us(us):
+        time.sleep(us / 1000000)
+
+if hasattr(asyncio, "sleep_ms"):
+    sleep_ms = asyncio.sleep_ms
+else:
+    async def sleep_ms(ms):
+        await asyncio.sleep(ms / 1000)
+
+try:
+    ThreadSafeFlag = asyncio.ThreadSafeFlag
+except AttributeError:
+    class ThreadSafeFlag:
+        """ThreadSafeFlag for CPython asyncio.
+
+        set() may be called from an interrupt handler or another thread, it
+        hands over to the loop of the waiter, a set() before the first
+        wait() is kept. wait() clears the flag when it returns.
+        """
+
+        def __init__(self):
+            self._event = asyncio.Event()
+            self._loop = None
+            self._pending = False
+
+        def set(self):
+            loop = self._loop
+            if loop is None:
+                self._pending = True
+            else:
+                loop.call_soon_threadsafe(self._event.set)
+
+        def clear(self):
+            self._pending = False
+            self._event.clear()
+
+        async def wait(self):
+            self._loop = asyncio.get_running_loop()
+            if self._pending:
+                self._pending = False
+                self._event.set()
+            await self._event.wait()
+            self._event.clear()
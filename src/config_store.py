@@ -0,0 +1,109 @@
+import json
+import os
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+import log
+
+# Stores with pending writes are flushed by config_writer() once edits stop for this long
+DEBOUNCE = 2
+
+stores = []
+_changed = asyncio.Event()
+
+
+def _exists(path):
+    try:
+        os.stat(path)
+        return True
+    except OSError:
+        return False
+
+
+def replace(tmp_path, path):
+    """Move a fully written temp file over path."""
+    try:
+        os.rename(tmp_path, path)
+    except OSError:
+        # FAT can't rename over an existing file
+        os.remove(path)
+        os.rename(tmp_path, path)
+
+
+class ConfigStore:
+    """Cached JSON config file with dirty tracking.
+
+    The file is read and parsed on first access to data. set() only
+    updates the cache, the file is written later by config_writer(), so a
+    burst of edits costs one flash write. Writes go to a temp file that is
+    renamed over the config, a power cut leaves either the old or the new
+    file.
+    """
+
+    def __init__(self, path, default):
+        self.path = path
+        self.tmp_path = path + ".tmp"
+        self.dirty = False
+        self.writes = 0
+        self.loaded = False
+        self._default = default
+        self._data = None
+        stores.append(self)
+
+    @property
+    def data(self):
+        if not self.loaded:
+            self._data = self.load(self._default)
+            self.loaded = True
+        return self._data
+
+    def load(self, default):
+        # A temp file without the config means the rename was interrupted
+        for path in (self.path, self.tmp_path):
+            try:
+                with open(path) as read_file:
+                    return json.load(read_file)
+            except Exception as e:
+                if path == self.path and _exists(path):
+                    log.error("Can't load config %s: %s", path, e)
+        return default
+
+    def set(self, data):
+        self._data = data
+        self.loaded = True
+        self.dirty = True
+        _changed.set()
+
+    def flush(self):
+        if not self.dirty:
+            return False
+        with open(self.tmp_path, "w") as write_file:
+            write_file.write(json.dumps(self.data))
+        replace(self.tmp_path, self.path)
+        self.dirty = False
+        self.writes += 1
+        return True
+
+
+def flush_all():
+    for store in stores:
+        store.flush()
+
+
+async def config_writer(delay=DEBOUNCE):
+    while True:
+        await _changed.wait()
+        _changed.clear()
+        # Debounce, keep waiting while edits are still coming
+        while True:
+            await asyncio.sleep(delay)
+            if not _changed.is_set():
+                break
+            _changed.clear()
+        try:
+            flush_all()
+        except Exception as e:
+            log.error("Can't write config: %s", e)
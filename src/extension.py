@@ -1,18 +1,31 @@
 # import main module
 import time
+import boot_profile
+from extension_modules import MODULES
+
+# Time the extension imports one by one, the import statements below are
+# then cache hits
+boot_profile.mark("web until extension import")
+boot_profile.imports(("ulab", "machine", "lib.microdot.microdot", "lib.microdot.sse",
+                      "lib.stepper_doser_math") + MODULES)
 
 try:
     import uasyncio as asyncio
     from ulab import numpy as np
-    from machine import I2C, Pin, ADC
-
 except ImportError:
     import asyncio
     import numpy as np
+
+try:
+    from machine import I2C, Pin, ADC
+
+except ImportError:
+    # Without machine, or the sim package, pins are mocked
     from unittest.mock import Mock, MagicMock
 
     loaded = False
-    Pin = Mock()
+    Pin = MagicMock()
+    I2C = MagicMock()
     class ADC:
         def __init__(self, *args):
             print("Init ADC")
@@ -23,64 +36,209 @@ except ImportError:
 
 import web
 from lib.stepper_doser_math import linear_interpolation
-import json
-from lib.microdot.microdot import send_file
+from lib.microdot.microdot import send_file, Response
 from lib.microdot.sse import with_sse
+from ph_convert import PhConverter, points_key, KINDS
+from sampling import SensorChannel
+from sse_hub import Broadcast, ClientLimit
+from ph_chart import ChartCache
+from history import History
+from config_store import ConfigStore, config_writer
+from static_pages import StaticPage, CachedJson, load_manifest
+from ato_control import AtoController
+from recalibration import Recalibrator, validate_points
+import metrics
+from ads1x15 import ADS1115
+from adc_scan import ScanScheduler
+from acquisition import AcqProfile, Oversampler
+from job_scheduler import Scheduler, DailyJob
+from threshold_alert import ThresholdAlert
+from sample_worker import SampleWorker, allocate_lock
+import log
+
+boot_profile.mark("extension imports")
 
 # Variables
 ph = 0
 ph_adc_avg = None
+ph_adc_uv = None
+ph_alarm = False
 tds_adc_avg = 0
 temp = None
-ph_chart_points = []
-ph_points = []
-voltage_points = []
-ato_start = time.time()
+ph_converter = PhConverter()
+# Samples are kept in fixed point, TDS in mV and pH probe in uV, so no
+# float is allocated per sample. Averages turn into floats in read_sensors
+TDS_WINDOW = 5
+tds_channel = SensorChannel(TDS_WINDOW, typecode='l')
+PH_WINDOW = 5
+ph_channel = SensorChannel(PH_WINDOW, typecode='l')
+
+# Probes on ADS1x15 chips share one I2C bus, the scanner owns the bus lock
+# and round-robins single-shot channels, further probes are more
+# adc_scanner.add() calls. The PCB routes the bus on its "SCL PH"/"SDA PH"
+# nets, the port defaults would put it on one of the pump analog pins
+I2C_ID = 0
+PH_I2C_SCL = 9
+PH_I2C_SDA = 46
+i2c = I2C(I2C_ID, scl=Pin(PH_I2C_SCL), sda=Pin(PH_I2C_SDA))
+adc_scanner = ScanScheduler(period_ms=500)
+
+# The pH probe is AIN0 of the first chip, oversampled in continuous mode:
+# 64 samples at 475 SPS averaged into one reading every 500ms
+PH_ADC_ADDRESS = 0x48
+PH_PROFILE = AcqProfile(rate=6, block=64, decimation=64, filter="mean", interval_ms=500)
+# The chip can also compare every conversion against the pH alarm limits
+# and pull its ALERT/RDY pin low while the pH is out of range. The stock PCB
+# leaves ALERT/RDY unconnected: wire it to a free GPIO (with the ADS1115
+# pull-up to 3V3 that the pin needs, the internal pull-up is enabled too)
+# and set PH_ALERT_PIN to that GPIO to turn the hardware alarm on
+PH_ALERT_PIN = None
+PH_ALARM_LIMITS = (7.0, 8.6)
+# With PH_SAMPLING_THREAD the probe is read in a second thread at a fixed
+# period, one block spread over each interval, so a slow request on the
+# event loop doesn't move the samples. The thread and the loop then share
+# the chip through a thread lock
+PH_SAMPLING_THREAD = False
+ph_thread_lock = allocate_lock() if PH_SAMPLING_THREAD else None
+ph_adc = ADS1115(i2c, PH_ADC_ADDRESS)
+ph_alert = None
+if PH_ALERT_PIN is not None:
+    ph_alert = ThresholdAlert(ph_adc, Pin(PH_ALERT_PIN, mode=Pin.IN, pull=Pin.PULL_UP),
+                              Pin.IRQ_FALLING | Pin.IRQ_RISING, channel1=0, rate=PH_PROFILE.rate,
+                              lock=ph_thread_lock)
+ph_sampler = Oversampler(ph_adc, channel1=0, profile=PH_PROFILE,
+                         consumer=lambda ticks, uv: ph_channel.push(uv), lock=adc_scanner.lock,
+                         alert=ph_alert, fixed=True)
+ph_worker = None
+if PH_SAMPLING_THREAD:
+    PH_THREAD_PERIOD_MS = max(ph_adc.conversion_ms(PH_PROFILE.rate), PH_PROFILE.interval_ms // PH_PROFILE.block)
+    ph_worker = SampleWorker(ph_adc.alert_read, PH_THREAD_PERIOD_MS, ph_sampler.feed,
+                             setup=ph_sampler.conversion_start, typecode='h', lock=ph_thread_lock)
+    for _key in ("samples", "dropped", "overruns", "late_max_us", "late_avg_us"):
+        metrics.gauges["ph_thread_" + _key] = lambda key=_key: ph_worker.stats()[key]
+boot_profile.mark("sensors")
+
+# SSE streams, one producer serializes every update for all clients.
+# Connections are long-lived, the client limit is shared by all streams
+SSE_MAX_CLIENTS = 6
+SSE_HEARTBEAT = 15
+SSE_IDLE_TIMEOUT = 3600
+sse_clients = ClientLimit(SSE_MAX_CLIENTS)
+ph_stream = Broadcast("ph", limit=sse_clients, heartbeat=SSE_HEARTBEAT, idle_timeout=SSE_IDLE_TIMEOUT)
+ph_chart_stream = Broadcast("ph-chart", limit=sse_clients, heartbeat=SSE_HEARTBEAT,
+                            idle_timeout=SSE_IDLE_TIMEOUT)
+ato_stream = Broadcast("ato", limit=sse_clients, heartbeat=SSE_HEARTBEAT, idle_timeout=SSE_IDLE_TIMEOUT)
+metrics.gauges["sse_clients"] = lambda: sse_clients.active
+for _stream in (ph_stream, ph_chart_stream, ato_stream):
+    metrics.gauges["sse_" + _stream.name] = lambda stream=_stream: len(stream.subscribers)
+
+# Serialized calibration chart, the SSE stream uses the compact fixed precision encoding
+PH_CHART_ENCODING = "fixed"
+# Voltages the chart curve is sampled at, across the full pH range
+PH_CHART_POINTS = 60
+ph_chart = ChartCache()
+
+# Extension pages, served gzipped when the build made a .gz variant
+page_manifest = load_manifest("extension_manifest.json")
+ato_page = StaticPage("ato/static/ato.html", page_manifest)
+ph_page = StaticPage("ph/static/ph.html", page_manifest)
+navbar_cookie = CachedJson(lambda: extension_navbar)
+ph_cal_cookie = CachedJson(lambda: ph_cal_points)
+
+# Sensor history on flash, rolled up into sample/minute/hour/day tiers.
+# The write positions are recovered on first use, not at boot
+sensor_history = History("history")
+boot_profile.mark("streams, pages and history")
 
 ato = Pin(48, Pin.OUT)
-ato.value(0)
+# Float sensor interrupt, 300s deadline and TDS limit cut the pump off
+ato_controller = AtoController(ato, Pin(6, mode=Pin.IN, pull=Pin.PULL_UP), Pin.IRQ_RISING,
+                               timeout=300, tds_limit=0.5)
 
 
+# ATO jobs run on the extension's own scheduler, so nothing is handed to
+# the main schedule and a schedule edit doesn't recompute it
 addon_schedule = []
-try:
-    with open("config/ato_schedule.json") as read_file:
-        _schedule = json.load(read_file)
-        print("ATO schedule: ", _schedule)
 
-except Exception as e:
-    print("Can't load ATO schedule config, generate new")
-    _schedule = []
+
+def local_utc_offset():
+    # Schedule times are local, the upstream settings keep the timezone in hours from UTC
+    return int(float(getattr(web, "timezone", 0)) * 3600)
+
+
+ato_scheduler = Scheduler(utc_offset=local_utc_offset)
+ato_config = ConfigStore("config/ato_schedule.json", [])
+_schedule = []
 
 
 def enable_ato_cb(callback_id, current_time, callback_memory):
-    print("ATO enabled ")
-    global ato_start
+    log.info("ATO enabled")
     web.storage[f"remaining1"] = web.storage[f"pump1"]
-    ato_start = time.time()
-    _ato = Pin(48, Pin.OUT)
-    _ato.value(1)
+    # Not started at all over the TDS limit, check_tds() only runs once per sampling window
+    ato_controller.start(tds_adc_avg)
 
 
-def add_ato_jobs_to_sched():
-    global addon_schedule
-    new_addon_schedule = []
-    for job in _schedule:
-        _job = job.copy()
-        _job["job"] = enable_ato_cb
-        new_addon_schedule.append(_job)
-    addon_schedule = new_addon_schedule.copy()
+def ato_jobs(schedule, skip_bad=False):
+    # Jobs are keyed by their settings, an unchanged entry keeps its id
+    jobs = {}
+    for spec in schedule:
+        try:
+            job = DailyJob.from_spec(spec)
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            if not skip_bad:
+                raise
+            log.error("Skipped ATO schedule entry %s: %s", spec, e)
+            continue
+        job_id = "%s-%s-%s" % (spec.get("start_time"), spec.get("end_time"), spec.get("frequency"))
+        jobs[job_id] = job
+    return jobs
+
+
+def migrate_ato_entry(spec):
+    # The schedule page used to accept fractional frequencies, they are rounded to whole runs
+    frequency = spec.get("frequency", 1)
+    if isinstance(frequency, float) and frequency != int(frequency):
+        spec["frequency"] = max(1, int(frequency + 0.5))
+        return True
+    return False
+
+
+def add_ato_jobs_to_sched(jobs):
+    # Only added and removed jobs touch the scheduler
+    for job_id in ato_scheduler.job_ids():
+        if job_id not in jobs:
+            ato_scheduler.remove(job_id)
+    for job_id, job in jobs.items():
+        if job_id not in ato_scheduler:
+            ato_scheduler.add(job_id, job, enable_ato_cb)
+
+
+def load_ato_schedule():
+    # Read once the tasks run, so the config isn't parsed during the import
+    global _schedule
+    _schedule = ato_config.data
+    log.info("ATO schedule: %s", _schedule)
+    try:
+        migrated = [spec for spec in _schedule if isinstance(spec, dict) and migrate_ato_entry(spec)]
+        if migrated:
+            log.warning("Rounded fractional ATO frequencies: %s", migrated)
+            ato_config.set(_schedule)
+        # A bad entry is logged and left out, the others still run
+        add_ato_jobs_to_sched(ato_jobs(_schedule, skip_bad=True))
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        log.error("Can't load ATO schedule: %s", e)
 
 
-add_ato_jobs_to_sched()
 loaded = True
 
-try:
-    with open("config/ph_cal_points.json", 'r') as read_file:
-        ph_cal_points = json.load(read_file)
-
-except Exception as e:
-    print("Can't load ph calibration setting config, load default ", e)
-    ph_cal_points = {}
+# Calibration points are read by load_ph_model() once the tasks run
+ph_cal_config = ConfigStore("config/ph_cal_points.json", {})
+ph_cal_points = {}
+# Calibration model, kept in binary next to the points and reloaded at boot
+PH_MODEL_PATH = "config/ph_cal_model.bin"
+PH_MODEL_KIND = "segments"
+recalibrator = Recalibrator(ph_converter, PH_MODEL_PATH, PH_MODEL_KIND)
+boot_profile.mark("ato and calibration")
 
 
 def manual_sort(data):
@@ -121,7 +279,8 @@ def extrapolate(data, min_ph=0, max_ph=14, num_points=20):
 
 def linear_interpolation(data, num_points=20):
     merged = []
-    print(data)
+    if __debug__:
+        log.debug("Interpolate pH calibration points: %s", data)
     # Extract points from the data dictionary and sort by pH value
     points = [(d['ph'], d['adc']) for d in data.values()]
     points.sort(key=lambda x: x[0])  # Sorting by pH value
@@ -138,24 +297,146 @@ def linear_interpolation(data, num_points=20):
     return merged
 
 
+def load_ph_model():
+    # The saved model is only used if it was computed from the current points
+    global ph_cal_points
+    ph_cal_points = ph_cal_config.data
+    if not ph_cal_points:
+        return
+    if ph_converter.load(PH_MODEL_PATH, points_key(ph_cal_points)):
+        log.info("Loaded pH calibration model")
+        set_ph_alarm_limits()
+    else:
+        log.info("Compute pH calibration model")
+        recalibrator.submit(ph_cal_points)
+
+
+def set_ph_alarm_limits():
+    # pH limits to probe voltages for the comparator, without temperature compensation
+    if ph_alert is not None and ph_converter.ready:
+        low, high = [ph_converter.to_adc(v) for v in PH_ALARM_LIMITS]
+        ph_alert.set_limits(min(low, high), max(low, high))
+
+
+def on_ph_alarm(alert, active):
+    global ph_alarm
+    ph_alarm = active
+    if active:
+        log.warning("pH out of range")
+    else:
+        log.info("pH back in range")
+    publish_ph()
+
+
+if ph_alert is not None:
+    ph_alert.listeners.append(on_ph_alarm)
+
+
+def on_recalibrated(job, points):
+    # The new model is live, keep the points and tell the chart clients
+    global ph_cal_points
+    if points is not ph_cal_points:
+        ph_cal_points = points
+        ph_cal_config.set(points)
+        ph_cal_cookie.invalidate()
+    set_ph_alarm_limits()
+    publish_ph_chart()
+
+
+recalibrator.listeners.append(on_recalibrated)
+
+
+def ph_chart_data():
+    # Sampled from the converter, so the chart is the model readings use, nernst fits included
+    cal_adc = sorted(d['adc'] for d in ph_cal_points.values())
+    try:
+        ends = [ph_converter.to_adc(ph_converter.ph_min), ph_converter.to_adc(ph_converter.ph_max)]
+    except ValueError:
+        # Flat end segment, the curve ends at the calibration points
+        ends = [cal_adc[0], cal_adc[-1]]
+    voltage_points = sorted(set(list(np.linspace(min(ends), max(ends), num=PH_CHART_POINTS)) + cal_adc))
+    ph_points = [ph_converter.convert(v) for v in voltage_points]
+    chart_points = [(ph_converter.convert(v), v) for v in cal_adc]
+    return chart_points, ph_points, voltage_points
+
+
+def update_ph():
+    global ph
+    if ph_adc_uv is not None and ph_converter.ready:
+        temp_cc = None if temp is None else int(round(temp * 100))
+        ph = ph_converter.convert_uv(ph_adc_uv, temp_cc) / 1000
+
+
+def publish_ph():
+    ph_stream.publish({
+        "ph": ph,
+        "ph_adc": ph_adc_avg,
+        "alarm": ph_alarm,
+        "temp": temp,
+        "tds_adc": tds_adc_avg
+    })
+
+
+def publish_ph_chart():
+    if not ph_cal_points or not ph_converter.ready:
+        return
+    # The chart is built from the calibration only when a client asks for it,
+    # its version is the calibration's, not a counter restarting at boot
+    ph_chart.update(ph_chart_data, points_key(ph_cal_points) << 1 | KINDS[PH_MODEL_KIND])
+    ph_chart_stream.publish_lazy(lambda: ph_chart.get(PH_CHART_ENCODING), ph_chart.not_modified)
+
+
+def publish_ato():
+    ato_stream.publish({
+        "Schedule": _schedule
+    })
+
+
+def page_response(request, page):
+    # Cookies are set on 304 too, so the cached page still gets fresh settings
+    if page.etag is None:
+        return Response("Not found", status_code=404)
+    if page.not_modified(request):
+        response = Response(status_code=304)
+    elif page.use_gzip(request):
+        response = send_file(page.path, compressed=True, file_extension=".gz")
+    else:
+        response = send_file(page.path, compressed=False, file_extension="")
+    response.headers["ETag"] = page.etag
+    response.headers["Vary"] = "Accept-Encoding"
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+def with_stream(stream):
+    # Reject extra clients before the SSE task is created
+    def decorator(f):
+        sse_handler = with_sse(f)
+
+        async def handler(request, *args, **kwargs):
+            if stream.full:
+                log.warning("SSE client limit reached")
+                return "Too many SSE clients", 503
+            return await sse_handler(request, *args, **kwargs)
+        return handler
+    return decorator
+
+
 # define async functions here
 async def test_extension():
-    global ph_chart_points
-    global ph_points, voltage_points
-    if ph_cal_points:
-        print("Interpolate ph points")
-        ph_chart_points = linear_interpolation(ph_cal_points)
-        print("Extrapolate PH chart")
-        ph_points, voltage_points = extrapolate(ph_chart_points)
-        print("Extrapolation finished")
-
-    print(ph_points)
+    boot_profile.mark("until extension tasks")
+    load_ph_model()
+    boot_profile.mark("load pH model")
+    load_ato_schedule()
+    boot_profile.mark("load ATO schedule")
+    publish_ph_chart()
+    publish_ato()
 
     @web.app.route('/ato')
+    @metrics.timed("ato")
     async def web_control(request):
-        response = send_file("ato/static/ato.html", compressed=False,
-                             file_extension="")
-        response.set_cookie("Extension", json.dumps(extension_navbar))
+        response = page_response(request, ato_page)
+        response.set_cookie("Extension", navbar_cookie.get())
         response.set_cookie("color", web.color)
         response.set_cookie("theme", web.theme)
         response.set_cookie("timeFormat", web.timeformat)
@@ -163,122 +444,137 @@ async def test_extension():
 
     # Web UI extensions also can be added to main web.py module
     @web.app.route('/ph')
+    @metrics.timed("ph")
     async def web_control(request):
-        response = send_file("ph/static/ph.html", compressed=False,
-                             file_extension="")
-        response.set_cookie("Extension", json.dumps(extension_navbar))
-        response.set_cookie("phCalPoints", json.dumps(ph_cal_points))
+        response = page_response(request, ph_page)
+        response.set_cookie("Extension", navbar_cookie.get())
+        response.set_cookie("phCalPoints", ph_cal_cookie.get())
         response.set_cookie("color", web.color)
         response.set_cookie("theme", web.theme)
         return response
 
     @web.app.route('/ph-upload-points', methods=['POST'])
+    @metrics.timed("ph-upload-points")
     async def ph_upload_points(request):
         data = request.json
-        print("PH calibration points:", data)
-        points = [(data[d]['adc'], data[d]['ph']) for d in data]
-        if len(points) < 2:
-            print("Not enought calibration points")
-            return {}
-        global ph_chart_points
-        global ph_points, voltage_points
-        ph_chart_points = linear_interpolation(data)
-        ph_points, voltage_points = extrapolate(ph_chart_points)
-        #print(ph_chart_points)
-
-        with open("config/ph_cal_points.json", 'w') as write_file:
-            write_file.write(json.dumps(data))
-        global ph_cal_points
-        ph_cal_points = data
-
-        return {}
+        log.info("pH calibration points: %s", data)
+        error = validate_points(data)
+        if error:
+            log.warning(error)
+            return {"error": error}, 400
+        return {"job": recalibrator.submit(data)}, 202
+
+    @web.app.route('/ph-upload-points/status')
+    @metrics.timed("ph-upload-status")
+    async def ph_upload_status(request):
+        return recalibrator.status()
+
+    @web.app.route('/ph-chart')
+    @metrics.timed("ph-chart")
+    async def ph_chart_web(request):
+        encoding = request.args.get("encoding", PH_CHART_ENCODING)
+        version = request.args.get("version")
+        try:
+            body = ph_chart.get(encoding, int(version) if version else None)
+        except ValueError as e:
+            return {"error": str(e)}, 400
+        return body, 200, {"Content-Type": "application/json"}
+
+    @web.app.route('/history')
+    @metrics.timed("history")
+    async def history_web(request):
+        tier = request.args.get("tier", "minute")
+        if tier not in sensor_history.tiers:
+            return {"error": "Unknown tier"}, 400
+        try:
+            end = int(request.args.get("end", time.time()))
+            start = int(request.args.get("start", end - 86400))
+        except ValueError:
+            return {"error": "Wrong time range"}, 400
+        return sensor_history.query_json(tier, start, end), 200, {"Content-Type": "application/json"}
+
+    @web.app.route('/metrics')
+    async def metrics_web(request):
+        return metrics.as_json(), 200, {"Content-Type": "application/json"}
+
+    @web.app.route('/boot-profile')
+    async def boot_profile_web(request):
+        return boot_profile.as_json(), 200, {"Content-Type": "application/json"}
+
+    @web.app.route('/logs', methods=['GET', 'POST'])
+    async def logs_web(request):
+        # GET ?since=<seq>&level=<name> returns newer records, POST sets the levels
+        if request.method == 'POST':
+            try:
+                log.level = log.LEVELS[request.json.get("level", log.NAMES[log.level])]
+                log.console_level = log.LEVELS[request.json.get("console", log.NAMES[log.console_level])]
+            except (KeyError, AttributeError):
+                return {"error": "Unknown log level"}, 400
+            return {"level": log.NAMES[log.level], "console": log.NAMES[log.console_level]}
+        try:
+            since = int(request.args.get("since", 0))
+            min_level = log.LEVELS[request.args.get("level", "DEBUG")]
+        except (ValueError, KeyError):
+            return {"error": "Wrong log query"}, 400
+        return {
+            "next": log.next_seq(),
+            "lines": [log.format_record(r) for r in log.records(since, min_level)]
+        }
 
     @web.app.route('/ato-sse')
-    @with_sse
+    @with_stream(ato_stream)
     async def ato_sse(request, sse):
-        print("Got connection")
-        old_ato_schedule = None
+        if __debug__:
+            log.debug("SSE client connected")
         try:
-            for _ in range(30):
-                if old_ato_schedule != _schedule:
-                    print("<<<", _schedule)
-                    old_ato_schedule = _schedule.copy()
-                    event = json.dumps({
-                        "Schedule": _schedule
-                    })
-                    print("send ATO settigs")
-                    await sse.send(event)  # unnamed event
-                    await asyncio.sleep(1)
-                else:
-                    await asyncio.sleep(1)
+            await ato_stream.serve(sse, request.headers.get("Last-Event-ID"))
         except Exception as e:
-            print(f"Error in SSE loop: {e}")
-        print("SSE closed")
+            log.error("Error in SSE loop: %s", e)
+        if __debug__:
+            log.debug("SSE closed")
 
     @web.app.route('/ato/schedule', methods=['GET', 'POST'])
+    @metrics.timed("ato-schedule")
     async def ato_schedule_web(request):
         global _schedule
         if request.method == 'GET':
             return _schedule
         else:
+            try:
+                jobs = ato_jobs(request.json)
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                return {"error": "Wrong ATO schedule: %s" % e}, 400
             _schedule = request.json
-            print("Got new schedule")
-            print(_schedule)
-            with open("config/ato_schedule.json", "w") as write_file:
-                write_file.write(json.dumps(_schedule))
-            add_ato_jobs_to_sched()
-            web.update_schedule(web.schedule)
+            log.info("Got new ATO schedule: %s", _schedule)
+            ato_config.set(_schedule)
+            add_ato_jobs_to_sched(jobs)
+            publish_ato()
 
     @web.app.route('/ph-sse')
-    @with_sse
+    @with_stream(ph_stream)
     async def ph_sse(request, sse):
-        print("Got connection")
-        global ph_adc_avg
-        global ph
-        global temp
-        global tds_adc_avg
+        if __debug__:
+            log.debug("SSE client connected")
         try:
-            for _ in range(30):
-                event = json.dumps({
-                    "ph": ph,
-                    "ph_adc": ph_adc_avg,
-                    "temp": temp,
-                    "tds_adc": tds_adc_avg
-                })
-                await sse.send(event)  # unnamed event
-                await asyncio.sleep(1)
+            await ph_stream.serve(sse, request.headers.get("Last-Event-ID"))
         except Exception as e:
-            print(f"Error in SSE loop: {e}")
-        print("SSE closed")
+            log.error("Error in SSE loop: %s", e)
+        if __debug__:
+            log.debug("SSE closed")
 
     @web.app.route('/ph-chart-sse')
-    @with_sse
+    @with_stream(ph_chart_stream)
     async def ph_chart_sse(request, sse):
-        print("Got connection")
-        old_ph_chart_points = None
+        if __debug__:
+            log.debug("SSE client connected")
         try:
-            for _ in range(10):
-                if old_ph_chart_points != ph_chart_points:
-                    old_ph_chart_points = ph_chart_points.copy()
-                    print(ph_points)
-                    print(voltage_points)
-                    event = json.dumps({
-                        "PhChartPoints": old_ph_chart_points,
-                        "PhPoints": ph_points.tolist(),
-                        "AdcPoints": voltage_points.tolist()
-                    })
-                    print("event")
-
-                    print("send Ph Chart settigs")
-                    await sse.send(event)  # unnamed event
-                    await asyncio.sleep(1)
-                else:
-                    # print("No updates, skip")
-                    await asyncio.sleep(1)
+            await ph_chart_stream.serve(sse, request.headers.get("Last-Event-ID"))
         except Exception as e:
-            print(f"Error in SSE loop: {e}")
-        print("SSE closed")
+            log.error("Error in SSE loop: %s", e)
+        if __debug__:
+            log.debug("SSE closed")
 
+    boot_profile.mark("extension routes")
 
 def calculate_average(values):
     # print(f"Calculete average, len: {len(values)}")
@@ -295,42 +591,53 @@ def adc_to_volt(value, debug=False):
     else:
         _volt = round(value / 4096 * 3.3, 2)
         if debug:
-            print(f"convert {value} to {_volt}V")
+            log.debug("convert %s to %sV", value, _volt)
         return _volt
 
 
+def adc_to_mv(value):
+    # Integer adc_to_volt(), in mV without its 10mV rounding
+    return (value * 3300 + 2048) >> 12
+
+
 async def read_sensors():
-    global tds_adc_avg
+    global tds_adc_avg, ph_adc_avg, ph_adc_uv
     _adc = ADC(Pin(5, mode=Pin.IN, pull=None))
-    print("Start TDS sensor sampling")
-    tds_buffer = []
+    log.info("Start TDS sensor sampling")
     while 1:
-        for _ in range(5):
+        for _ in range(TDS_WINDOW):
             # TDS ADC
+            _start = metrics.ticks_us()
             _value = _adc.read()
-            tds_adc = adc_to_volt(_value)
-            tds_buffer.append(tds_adc)
+            metrics.record("io", "tds_adc", _start)
+            tds_channel.push(adc_to_mv(_value))
             # print("ADS1115 TDS Result: ", ph_adc)
 
-            await asyncio.sleep(0.5)
-        if tds_buffer:
-            tds_adc_avg = calculate_average(tds_buffer)
-            tds_buffer = []
-        print("TDS: ", tds_adc_avg)
+            await metrics.sleep_ms("read_sensors", 500)
+        tds_adc_avg = tds_channel.mean() / 1000
+        if ph_channel.samples:
+            ph_adc_uv = ph_channel.mean()
+            ph_adc_avg = ph_adc_uv / 1000000
+        ato_controller.check_tds(tds_adc_avg)
+        update_ph()
+        publish_ph()
+        # No pH is stored until there is a model, a 0 would drag the rollups down
+        sensor_history.append(int(time.time()), ph if ph_converter.ready else None, ph_adc_avg, temp,
+                              tds_adc_avg)
+        if __debug__:
+            log.debug("TDS: %s", tds_adc_avg)
 
 
 async def ato_worker():
-    global ato
-    global ato_start
-    float_sensor = Pin(6, mode=Pin.IN, pull=Pin.PULL_UP)
-    while True:
-        if tds_adc_avg >= 0.5 or float_sensor.value() or time.time() > ato_start + 300:
-            ato.value(0)
-        await asyncio.sleep(1)
+    await ato_controller.run()
 
 
 # Define extension async tasks here
-extension_tasks = [test_extension, read_sensors, ato_worker]
+extension_tasks = [test_extension, read_sensors, ato_worker, config_writer, recalibrator.run,
+                   metrics.monitor, adc_scanner.run, ph_worker.run if ph_worker else ph_sampler.run,
+                   ato_scheduler.run, log.writer]
+if ph_alert is not None:
+    extension_tasks.append(ph_alert.run)
 
 # Define navbar extension here
 extension_navbar = [{"name": "ATO", "link": "/ato"}]
@@ -0,0 +1,10 @@
+"""Extension modules in import order.
+
+This is the only list of them. extension.py times their imports,
+build_extension.py compiles them and setup.py keeps them when it
+refreshes the upstream sources. extension.py and this module are not in
+the list, and this module is never compiled.
+"""
+MODULES = ("boot_profile", "compat", "log", "metrics", "ph_convert", "sampling", "sse_hub", "ph_chart", "history",
+           "config_store", "static_pages", "ato_control", "recalibration", "ads1x15", "adc_scan", "acquisition",
+           "job_scheduler", "threshold_alert", "sample_worker")
@@ -0,0 +1,278 @@
+import os
+import struct
+
+# Record: timestamp, ph, ph_adc, temp, tds_adc. Missing values are stored as NaN
+RECORD = "<I4f"
+RECORD_SIZE = struct.calcsize(RECORD)
+NAN = float("nan")
+CHUNK_RECORDS = 32
+
+# name, bucket seconds, segments, records per segment
+TIERS = (
+    ("sample", 10, 8, 1080),  # 1 day
+    ("minute", 60, 8, 1260),  # 1 week
+    ("hour", 3600, 8, 1095),  # 1 year
+    ("day", 86400, 4, 456),  # 5 years
+)
+
+
+def _value(v):
+    return NAN if v is None else v
+
+
+def _fmt(v):
+    if v != v:
+        return "null"
+    return "%.6g" % v
+
+
+class Segments:
+    """One tier of the history log on flash.
+
+    Records go into a ring of fixed size segment files. A segment is
+    allocated to full size on first use and then only rewritten in place,
+    when the ring wraps the oldest segment is reused, so writes rotate over
+    all segments instead of growing or rewriting one file.
+    """
+
+    def __init__(self, path, name, segments, records):
+        self.path = path
+        self.name = name
+        self.segments = segments
+        self.records = records
+        self.segment = 0
+        self.pos = 0
+        self.last_ts = 0
+        self._buf = bytearray(RECORD_SIZE)
+        self._file = None
+        self.loaded = False
+
+    def _file_name(self, segment):
+        return "%s/%s.%d.bin" % (self.path, self.name, segment)
+
+    def _first_ts(self, segment):
+        try:
+            with open(self._file_name(segment), "rb") as f:
+                data = f.read(4)
+        except OSError:
+            return 0
+        if len(data) < 4:
+            return 0
+        return struct.unpack("<I", data)[0]
+
+    def _ts_at(self, f, index):
+        f.seek(index * RECORD_SIZE)
+        f.readinto(self._buf)
+        return struct.unpack_from("<I", self._buf)[0]
+
+    def load(self):
+        """Find the write position on flash, done on first use."""
+        if not self.loaded:
+            self.loaded = True
+            self._scan()
+
+    def _scan(self):
+        # Current segment is the one with the newest first record
+        newest = 0
+        for segment in range(self.segments):
+            ts = self._first_ts(segment)
+            if ts > newest:
+                newest = ts
+                self.segment = segment
+        if not newest:
+            return
+        # Records written after the segment was reused are not older than its first one,
+        # leftovers from the previous lap are, so binary search the end of the new data
+        with open(self._file_name(self.segment), "rb") as f:
+            lo, hi = 1, self.records
+            while lo < hi:
+                mid = (lo + hi) >> 1
+                if self._ts_at(f, mid) >= newest:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            self.pos = lo
+            self.last_ts = self._ts_at(f, lo - 1)
+        if self.pos == self.records:
+            self._rotate()
+
+    def _open(self):
+        name = self._file_name(self.segment)
+        size = self.records * RECORD_SIZE
+        try:
+            if os.stat(name)[6] == size:
+                self._file = open(name, "r+b")
+                return
+        except OSError:
+            pass
+        # Preallocate the whole segment once
+        zeros = bytearray(512)
+        with open(name, "wb") as f:
+            left = size
+            while left > 0:
+                f.write(zeros if left >= 512 else zeros[:left])
+                left -= 512
+        self._file = open(name, "r+b")
+
+    def _rotate(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self.segment = (self.segment + 1) % self.segments
+        self.pos = 0
+
+    def append(self, ts, ph, ph_adc, temp, tds_adc):
+        if self._file is None:
+            self.load()
+            self._open()
+        struct.pack_into(RECORD, self._buf, 0, ts, ph, ph_adc, temp, tds_adc)
+        self._file.seek(self.pos * RECORD_SIZE)
+        self._file.write(self._buf)
+        self._file.flush()
+        self.last_ts = ts
+        self.pos += 1
+        if self.pos == self.records:
+            self._rotate()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _ordered(self):
+        # Oldest segment first, the current one last
+        for i in range(1, self.segments + 1):
+            segment = (self.segment + i) % self.segments
+            count = self.pos if segment == self.segment else self.records
+            if count:
+                yield segment, count
+
+    def query(self, start, end, buf):
+        """Yield (buffer, records) chunks with timestamps in [start, end]."""
+        self.load()
+        for segment, count in self._ordered():
+            try:
+                f = open(self._file_name(segment), "rb")
+            except OSError:
+                continue
+            try:
+                first = self._ts_at(f, 0)
+                if not first or first > end or self._ts_at(f, count - 1) < start:
+                    continue
+                lo, hi = 0, count
+                while lo < hi:
+                    mid = (lo + hi) >> 1
+                    if self._ts_at(f, mid) < start:
+                        lo = mid + 1
+                    else:
+                        hi = mid
+                f.seek(lo * RECORD_SIZE)
+                mv = memoryview(buf)
+                while lo < count:
+                    n = min(count - lo, len(buf) // RECORD_SIZE)
+                    f.readinto(mv[:n * RECORD_SIZE])
+                    lo += n
+                    last = struct.unpack_from("<I", buf, (n - 1) * RECORD_SIZE)[0]
+                    yield buf, n
+                    if last > end:
+                        return
+            finally:
+                f.close()
+
+
+class Rollup:
+    """Running mean of the samples in the current bucket of a tier.
+
+    Missing (NaN) values are left out of the means, a value missing from
+    the whole bucket stays NaN.
+    """
+
+    def __init__(self, bucket):
+        self.bucket = bucket
+        self.start = None
+        self.count = 0
+        self.sums = [0.0, 0.0, 0.0, 0.0]
+        self.counts = [0, 0, 0, 0]
+
+    def add(self, ts, values):
+        """Add a sample, return the finished bucket mean when a new bucket starts."""
+        start = ts - ts % self.bucket
+        done = None
+        if self.start is not None and start != self.start and self.count:
+            done = self.mean()
+        if start != self.start:
+            self.start = start
+            self.count = 0
+            for i in range(4):
+                self.sums[i] = 0.0
+                self.counts[i] = 0
+        for i in range(4):
+            v = values[i]
+            if v == v:
+                self.sums[i] += v
+                self.counts[i] += 1
+        self.count += 1
+        return done
+
+    def _mean(self, i):
+        c = self.counts[i]
+        return self.sums[i] / c if c else NAN
+
+    def mean(self):
+        return self.start, self._mean(0), self._mean(1), self._mean(2), self._mean(3)
+
+
+class History:
+    """Append-only sensor history with sample, minute, hour and day tiers."""
+
+    def __init__(self, path="history", tiers=TIERS):
+        self.path = path
+        try:
+            os.mkdir(path)
+        except OSError:
+            pass
+        self.tiers = {}
+        self._rollups = []
+        for name, bucket, segments, records in tiers:
+            store = Segments(path, name, segments, records)
+            self.tiers[name] = store
+            self._rollups.append((Rollup(bucket), store))
+        self._values = [0.0, 0.0, 0.0, 0.0]
+        self._buf = bytearray(RECORD_SIZE * CHUNK_RECORDS)
+
+    def append(self, ts, ph, ph_adc, temp, tds_adc):
+        values = self._values
+        values[0] = _value(ph)
+        values[1] = _value(ph_adc)
+        values[2] = _value(temp)
+        values[3] = _value(tds_adc)
+        for rollup, store in self._rollups:
+            done = rollup.add(ts, values)
+            if done is None:
+                continue
+            store.load()
+            # Keep every tier monotonic, even if the clock steps back
+            if done[0] > store.last_ts:
+                store.append(*done)
+
+    def close(self):
+        for store in self.tiers.values():
+            store.close()
+
+    def query_json(self, tier, start, end):
+        """Stream records of a tier as a JSON array of
+           [timestamp, ph, ph_adc, temp, tds_adc] rows, chunk by chunk."""
+        store = self.tiers[tier]
+        yield "["
+        sep = ""
+        for buf, n in store.query(start, end, self._buf):
+            rows = []
+            for i in range(n):
+                ts, ph, ph_adc, temp, tds_adc = struct.unpack_from(RECORD, buf, i * RECORD_SIZE)
+                if ts < start or ts > end:
+                    continue
+                rows.append("[%d,%s,%s,%s,%s]" % (ts, _fmt(ph), _fmt(ph_adc), _fmt(temp), _fmt(tds_adc)))
+            if rows:
+                yield sep + ",".join(rows)
+                sep = ","
+        yield "]"
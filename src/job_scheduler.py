@@ -0,0 +1,220 @@
+import time
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+try:
+    import uheapq as heapq
+except ImportError:
+    import heapq
+
+import metrics
+import log
+from compat import ticks_diff, ticks_ms
+
+DAY = 86400
+# Longest single wait of run(), the wall clock is checked again after it
+MAX_WAIT_S = 60
+# A wall clock off from the monotonic one by more than this has been set
+CLOCK_STEP_S = 2
+# Runs later than this are skipped instead of run at the wrong time
+LATE_S = 300
+
+
+def parse_hhmm(text):
+    """Seconds since midnight of a "HH:MM" time."""
+    hours, minutes = text.split(":")
+    hours, minutes = int(hours), int(minutes)
+    if not (0 <= hours < 24 and 0 <= minutes < 60):
+        raise ValueError("Wrong time: %s" % text)
+    return hours * 3600 + minutes * 60
+
+
+def parse_count(value):
+    """Whole number of runs of a "frequency", a fractional one is refused."""
+    count = int(value)
+    if count != value or count < 1:
+        raise ValueError("Wrong frequency: %s" % value)
+    return count
+
+
+class DailyJob:
+    """count runs a day from start to end, in local seconds since midnight.
+
+    Like in the schedule page the runs are (end - start) / count apart,
+    run k is at start + k * (end - start) // count, so the last one is an
+    interval before the end. An end before the start runs past midnight.
+    """
+
+    def __init__(self, start, end=None, count=1):
+        self.start = start
+        self.count = count if end is not None and count > 1 else 1
+        if self.count > 1:
+            if end < start:
+                end += DAY
+            self.span = end - start
+        else:
+            self.span = 0
+
+    @classmethod
+    def from_spec(cls, spec):
+        """Job of an ato_schedule.json entry, {"start_time", "end_time", "frequency"}."""
+        end = spec.get("end_time")
+        return cls(parse_hhmm(spec["start_time"]), parse_hhmm(end) if end else None,
+                   parse_count(spec.get("frequency", 1)))
+
+    def next_fire(self, t, utc_offset=0):
+        """First run time strictly after t, utc_offset is local time minus UTC in seconds."""
+        t += utc_offset
+        day = t - t % DAY
+        # The previous day's runs can reach past midnight
+        for base in (day - DAY, day):
+            first = base + self.start
+            if t < first:
+                return first - utc_offset
+            if self.span:
+                # Smallest k with k * span // count past t
+                k = ((t - first + 1) * self.count + self.span - 1) // self.span
+                if k < self.count:
+                    return first + k * self.span // self.count - utc_offset
+        return day + DAY + self.start - utc_offset
+
+
+class Scheduler:
+    """Timer jobs in a min-heap keyed by the next run time.
+
+    add(), remove() and update() are O(log n): removed jobs are only
+    marked in the heap and skipped when they reach the top, the heap is
+    rebuilt once they make up half of it. run() sleeps until the earliest
+    job is due and is woken early when an edit moves that time.
+
+    Callbacks are called as callback(job_id, run_time, data). utc_offset()
+    returns the local time minus UTC in seconds, the job times are local.
+    Waits are capped at MAX_WAIT_S, when the wall clock was set (an NTP
+    sync) or the offset changed meanwhile all run times are recomputed,
+    and a run more than LATE_S late is skipped and counted in skipped.
+    """
+
+    def __init__(self, utc_offset=None):
+        self.utc_offset = utc_offset or (lambda: 0)
+        self._heap = []
+        self._entries = {}
+        self._seq = 0
+        self._cancelled = 0
+        self._wake = asyncio.Event()
+        self.runs = 0
+        self.skipped = 0
+        self.clock_steps = 0
+        self._clock = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, job_id):
+        return job_id in self._entries
+
+    def add(self, job_id, job, callback, data=None, now=None):
+        if job_id in self._entries:
+            self.remove(job_id)
+        now = int(time.time()) if now is None else now
+        self._seq += 1
+        # [run time, tie breaker, id, job, callback, data, active]
+        entry = [job.next_fire(now, self.utc_offset()), self._seq, job_id, job, callback, data, True]
+        self._entries[job_id] = entry
+        heapq.heappush(self._heap, entry)
+        if self._heap[0] is entry:
+            self._wake.set()
+
+    def remove(self, job_id):
+        entry = self._entries.pop(job_id, None)
+        if entry is None:
+            return False
+        entry[6] = False
+        self._cancelled += 1
+        if self._cancelled * 2 > len(self._heap):
+            self._heap = [e for e in self._heap if e[6]]
+            heapq.heapify(self._heap)
+            self._cancelled = 0
+        return True
+
+    def job_ids(self):
+        return list(self._entries)
+
+    def update(self, job_id, job, callback, data=None):
+        self.add(job_id, job, callback, data)
+
+    def next_run(self):
+        """(run time, job id) of the earliest job, or None."""
+        self._drop_cancelled()
+        if not self._heap:
+            return None
+        return self._heap[0][0], self._heap[0][2]
+
+    def _drop_cancelled(self):
+        heap = self._heap
+        while heap and not heap[0][6]:
+            heapq.heappop(heap)
+            self._cancelled -= 1
+
+    async def _wait(self, timeout=None):
+        try:
+            if timeout is None:
+                await self._wake.wait()
+            else:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._wake.clear()
+
+    def _check_clock(self, now):
+        """Recompute the run times if the wall clock or the offset moved, True if so."""
+        offset = self.utc_offset()
+        ticks = ticks_ms()
+        last = self._clock
+        self._clock = (now, ticks, offset)
+        if last is None:
+            return False
+        expected = last[0] + ticks_diff(ticks, last[1]) / 1000
+        if abs(now - expected) <= CLOCK_STEP_S and offset == last[2]:
+            return False
+        self.clock_steps += 1
+        log.warning("Clock moved by %ds, rescheduling", int(now - expected) + offset - last[2])
+        self._heap = [e for e in self._heap if e[6]]
+        self._cancelled = 0
+        for entry in self._heap:
+            entry[0] = entry[3].next_fire(int(now), offset)
+        heapq.heapify(self._heap)
+        return True
+
+    async def run(self):
+        while True:
+            self._drop_cancelled()
+            heap = self._heap
+            if not heap:
+                self._clock = None
+                await self._wait()
+                continue
+            now = time.time()
+            if self._check_clock(now):
+                continue
+            left = heap[0][0] - now
+            if left > 0:
+                await self._wait(min(left, MAX_WAIT_S))
+                continue
+            entry = heapq.heappop(heap)
+            when, _, job_id, job, callback, data, _ = entry
+            # Runs missed while busy are skipped, the job goes on from now
+            entry[0] = job.next_fire(int(now), self.utc_offset())
+            heapq.heappush(heap, entry)
+            if now - when > LATE_S:
+                self.skipped += 1
+                log.warning("Skipped scheduled job %s, %ds late", job_id, int(now - when))
+                continue
+            metrics.histogram("late", "scheduler").add(int((now - when) * 1000000))
+            self.runs += 1
+            try:
+                callback(job_id, when, data)
+            except Exception as e:
+                log.error("Scheduled job %s failed: %s", job_id, e)
@@ -0,0 +1,106 @@
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+try:
+    from micropython import const
+except ImportError:
+    def const(value):
+        return value
+
+from compat import ticks_ms
+
+DEBUG = const(10)
+INFO = const(20)
+WARNING = const(30)
+ERROR = const(40)
+NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+LEVELS = {name: value for value, name in NAMES.items()}
+
+# Records below level are dropped at the call, records below console_level
+# are only kept in RAM. Debug calls in hot paths sit under `if __debug__:`,
+# so an optimized (mpy-cross -O) build doesn't even make the call.
+level = INFO
+console_level = INFO
+RING_SIZE = 64
+
+# (seq, ticks_ms, level, msg, args), the message is only formatted when read
+_ring = [None] * RING_SIZE
+_seq = 0
+_printed = 0
+_pending = asyncio.Event()
+
+
+def log(record_level, msg, *args):
+    global _seq
+    if record_level < level:
+        return
+    _ring[_seq % RING_SIZE] = (_seq, ticks_ms(), record_level, msg, args)
+    _seq += 1
+    if record_level >= console_level:
+        _pending.set()
+
+
+def debug(msg, *args):
+    if DEBUG >= level:
+        log(DEBUG, msg, *args)
+
+
+def info(msg, *args):
+    if INFO >= level:
+        log(INFO, msg, *args)
+
+
+def warning(msg, *args):
+    log(WARNING, msg, *args)
+
+
+def error(msg, *args):
+    log(ERROR, msg, *args)
+
+
+def format_record(record):
+    seq, ticks, record_level, msg, args = record
+    if args:
+        try:
+            msg = msg % args
+        except Exception:
+            msg = "%s %r" % (msg, args)
+    return "%d %d %s %s" % (seq, ticks, NAMES[record_level], msg)
+
+
+def records(since=0, min_level=DEBUG):
+    """Records still in the ring with seq >= since, oldest first."""
+    start = max(since, _seq - RING_SIZE, 0)
+    for seq in range(start, _seq):
+        record = _ring[seq % RING_SIZE]
+        if record[2] >= min_level:
+            yield record
+
+
+def next_seq():
+    return _seq
+
+
+async def writer(batch=8):
+    """Print new records of console_level and up, off the logging call path."""
+    global _printed
+    while True:
+        await _pending.wait()
+        _pending.clear()
+        end = _seq
+        start = max(_printed, end - RING_SIZE)
+        if start > _printed:
+            print("... %d log lines dropped" % (start - _printed))
+        n = 0
+        for seq in range(start, end):
+            record = _ring[seq % RING_SIZE]
+            # Skip records overwritten while the loop yielded
+            if record[0] != seq or record[2] < console_level:
+                continue
+            print(format_record(record))
+            n += 1
+            if n % batch == 0:
+                await asyncio.sleep(0)
+        _printed = end
@@ -0,0 +1,145 @@
+import gc
+import json
+from array import array
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+from compat import ticks_diff, ticks_us
+
+# Histogram bucket upper bounds in us, the last bucket counts everything slower
+BOUNDS_US = (100, 300, 1000, 3000, 10000, 30000, 100000, 300000, 1000000)
+# Wakeup period of the loop lag probe, the heap is sampled every GC_EVERY wakeups
+MONITOR_MS = 500
+GC_EVERY = 20
+# Also force a timed collection then, off by default as it stalls every task
+GC_COLLECT = False
+
+
+class Histogram:
+    """Fixed bucket duration histogram, no allocation per sample."""
+
+    def __init__(self, bounds=BOUNDS_US):
+        self.bounds = bounds
+        self.counts = array('I', [0] * (len(bounds) + 1))
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def add(self, us):
+        if us < 0:
+            us = 0
+        i = 0
+        bounds = self.bounds
+        while i < len(bounds) and us > bounds[i]:
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.total += us
+        if us > self.max:
+            self.max = us
+
+    def reset(self):
+        for i in range(len(self.counts)):
+            self.counts[i] = 0
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def as_dict(self):
+        return {"n": self.count, "sum": self.total, "max": self.max, "b": list(self.counts)}
+
+
+# Histograms by group and name: task wakeup lateness, handler run time,
+# sensor read time and GC pauses
+groups = {"late": {}, "handler": {}, "io": {}, "gc": {}}
+# Callables sampled when /metrics is read, e.g. SSE client counts
+gauges = {}
+mem_free = 0
+mem_alloc = 0
+_started = ticks_us()
+
+
+def histogram(group, name):
+    hist = groups[group].get(name)
+    if hist is None:
+        hist = groups[group][name] = Histogram()
+    return hist
+
+
+def record(group, name, start):
+    """Add the time since start (a ticks_us() value) to a histogram."""
+    histogram(group, name).add(ticks_diff(ticks_us(), start))
+
+
+async def sleep_ms(name, ms):
+    """asyncio.sleep that records how late the task woke up."""
+    start = ticks_us()
+    await asyncio.sleep(ms / 1000)
+    histogram("late", name).add(ticks_diff(ticks_us(), start) - ms * 1000)
+
+
+def timed(name):
+    """Record the run time of an async request handler."""
+    def decorator(f):
+        hist = histogram("handler", name)
+
+        async def handler(*args, **kwargs):
+            start = ticks_us()
+            try:
+                return await f(*args, **kwargs)
+            finally:
+                hist.add(ticks_diff(ticks_us(), start))
+        return handler
+    return decorator
+
+
+def sample_heap():
+    # Heap usage as it is, garbage included, without collecting
+    global mem_free, mem_alloc
+    if hasattr(gc, "mem_free"):
+        mem_free = gc.mem_free()
+        mem_alloc = gc.mem_alloc()
+
+
+def collect():
+    # Timed explicit collection, keeps the heap tidy and samples the pause
+    start = ticks_us()
+    gc.collect()
+    record("gc", "collect", start)
+    sample_heap()
+
+
+async def monitor(period_ms=MONITOR_MS, gc_every=GC_EVERY, gc_collect=GC_COLLECT):
+    """Loop lag probe, any task hogging the loop shows up as lateness here."""
+    n = 0
+    while True:
+        await sleep_ms("loop", period_ms)
+        n += 1
+        if n >= gc_every:
+            n = 0
+            if gc_collect:
+                collect()
+            else:
+                sample_heap()
+
+
+def reset():
+    for group in groups.values():
+        for hist in group.values():
+            hist.reset()
+
+
+def as_json():
+    data = {
+        "uptime_ms": ticks_diff(ticks_us(), _started) // 1000,
+        "mem_free": mem_free,
+        "mem_alloc": mem_alloc,
+        "bounds_us": BOUNDS_US,
+        "gauges": {name: gauge() for name, gauge in gauges.items()},
+    }
+    for group, hists in groups.items():
+        data[group] = {name: hist.as_dict() for name, hist in hists.items()}
+    return json.dumps(data)
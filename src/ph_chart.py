@@ -0,0 +1,110 @@
+import json
+from array import array
+
+try:
+    import ubinascii as binascii
+except ImportError:
+    import binascii
+
+ENCODINGS = ("json", "fixed", "b64")
+# Decimal places of the fixed encoding, matches what the UI displays
+PH_DIGITS = 3
+ADC_DIGITS = 5
+
+
+def _b64(values):
+    return binascii.b2a_base64(array('f', values)).decode().strip()
+
+
+def _rounded(values, digits):
+    return [round(v, digits) for v in values]
+
+
+class ChartCache:
+    """Serialized pH calibration chart, rebuilt only on a calibration change.
+
+    The chart points themselves are generated from the calibration lazily,
+    they are not kept resident unless a client asked for them.
+
+    Every encoding is built on first use and kept until the next update(),
+    so clients never trigger a re-serialization of an unchanged chart.
+
+    Encodings:
+      json  - full precision floats, the original payload
+      fixed - values rounded to PH_DIGITS/ADC_DIGITS decimal places
+      b64   - base64 little-endian float32 arrays, chart points interleaved
+
+    version identifies the calibration, the caller derives it from the
+    calibration itself so it means the same chart across reboots.
+    """
+
+    def __init__(self):
+        self.version = 0
+        self._source = None
+        self._chart_points = []
+        self._ph_points = []
+        self._adc_points = []
+        self._cache = {}
+
+    def update(self, source, version=None):
+        """New calibration, source() returns (chart_points, ph_points, adc_points).
+
+        Nothing is computed until a client asks for the chart. Without a
+        version the previous one is incremented.
+        """
+        self._source = source
+        self._chart_points = []
+        self._ph_points = []
+        self._adc_points = []
+        self._cache = {}
+        self.version = self.version + 1 if version is None else version
+
+    def _points(self):
+        if self._source is not None:
+            self._chart_points, self._ph_points, self._adc_points = self._source()
+            self._source = None
+
+    def not_modified(self):
+        return json.dumps({"Version": self.version, "NotModified": True})
+
+    def get(self, encoding="json", version=None):
+        """Serialized chart, or a not modified marker if the client has version."""
+        if version is not None and version == self.version:
+            return self.not_modified()
+        if encoding not in ENCODINGS:
+            raise ValueError("Unknown chart encoding: %s" % encoding)
+        payload = self._cache.get(encoding)
+        if payload is None:
+            self._points()
+            payload = getattr(self, "_encode_" + encoding)()
+            self._cache[encoding] = payload
+        return payload
+
+    def _encode_json(self):
+        return json.dumps({
+            "Version": self.version,
+            "PhChartPoints": [[p, a] for p, a in self._chart_points],
+            "PhPoints": list(self._ph_points),
+            "AdcPoints": list(self._adc_points)
+        })
+
+    def _encode_fixed(self):
+        return json.dumps({
+            "Version": self.version,
+            "PhChartPoints": [[round(p, PH_DIGITS), round(a, ADC_DIGITS)] for p, a in self._chart_points],
+            "PhPoints": _rounded(self._ph_points, PH_DIGITS),
+            "AdcPoints": _rounded(self._adc_points, ADC_DIGITS)
+        })
+
+    def _encode_b64(self):
+        interleaved = array('f')
+        for p, a in self._chart_points:
+            interleaved.append(p)
+            interleaved.append(a)
+        return json.dumps({
+            "Version": self.version,
+            "Encoding": "f32-b64",
+            "PhChartPoints": _b64(interleaved),
+            "PhPoints": _b64(self._ph_points),
+            "AdcPoints": _b64(self._adc_points)
+        })
@@ -0,0 +1,351 @@
+import json
+import struct
+from array import array
+
+try:
+    import ubinascii as binascii
+except ImportError:
+    import binascii
+
+try:
+    from ulab import numpy as np
+except ImportError:
+    try:
+        import numpy as np
+    except ImportError:
+        np = None
+
+SEGMENTS = 0
+NERNST = 1
+KINDS = {"segments": SEGMENTS, "nernst": NERNST}
+
+# magic, kind, knots, key, calibration temperature, min pH, max pH
+_HEADER = "<4sBBIfff"
+_MAGIC = b"PHM1"
+# A short model file raises struct.error on CPython, ValueError on MicroPython
+_STRUCT_ERROR = getattr(struct, "error", ValueError)
+_KELVIN = 273.15
+# Fixed point slopes are milli-pH per microvolt in Q24
+_Q = 24
+# Most a microvolt offset can be before the end clamp, kept in small ints
+_D_MAX = (1 << 29) - 1
+
+
+def points_key(cal_points):
+    """Checksum of the calibration points a saved model was computed from."""
+    # Sorted, dict order is not stable on MicroPython
+    points = sorted([k, d["ph"], d["adc"], d.get("temp")] for k, d in cal_points.items())
+    return binascii.crc32(json.dumps(points).encode()) & 0xFFFFFFFF
+
+
+class PhConverter:
+    """Calibration model converting pH probe voltage to pH.
+
+    The model is a handful of slope/intercept segments between voltage
+    knots, either one per pair of calibration points or a single least
+    squares (Nernst) line. Conversion is a binary search over the knots
+    plus one multiply-add, readings are clamped to [ph_min, ph_max]. With a
+    calibration temperature and a live temperature the result is
+    compensated for the Nernst slope change around the pH 7 isopotential
+    point.
+
+    convert_uv() is the same conversion in integers, microvolts in and
+    milli-pH out, for sample paths that keep fixed point values. It works
+    on a fixed point copy of the segments, knots in uV, the milli-pH at
+    each segment start and Q24 slopes, made on its first call per model.
+    """
+
+    def __init__(self, ph_min=0, ph_max=14):
+        self.size = 0
+        self.version = 0
+        self.kind = SEGMENTS
+        self.key = 0
+        self.cal_temp = None
+        self.ph_min = ph_min
+        self.ph_max = ph_max
+        self._knots = array('f')
+        self._slope = array('f')
+        self._intercept = array('f')
+        self._np_adc = None
+        self._np_ph = None
+        self._knots_uv = array('l')
+        self._ph0_m = array('l')
+        self._slope_q = array('l')
+        self._d_lim = array('l')
+        self._min_m = 0
+        self._max_m = 0
+        self._cal_ck = None
+        self._fixed_version = 0
+
+    @property
+    def cal_temp(self):
+        return self._cal_temp
+
+    @cal_temp.setter
+    def cal_temp(self, value):
+        self._cal_temp = value
+        # Calibration temperature in centi-kelvin for convert_uv()
+        self._cal_ck = None if value is None else int((value + _KELVIN) * 100 + 0.5)
+
+    @property
+    def ready(self):
+        return self.size > 1
+
+    def compile(self, ph_points, adc_points):
+        """Build segments through every (pH, voltage) pair, e.g. a dense chart table."""
+        pairs = sorted(zip(adc_points, ph_points))
+        adc = array('f', [0] * len(pairs))
+        ph = array('f', [0] * len(pairs))
+        size = 0
+        for x, y in pairs:
+            # Compare after the float32 store, close voltages can collapse into one
+            adc[size] = x
+            if size and adc[size] == adc[size - 1]:
+                continue
+            ph[size] = y
+            size += 1
+        self._set_segments(adc[:size], ph[:size], min(ph[:size]), max(ph[:size]))
+
+    def fit(self, cal_points, kind="segments"):
+        """Compute the model from the calibration points dict of ph_cal_points.json."""
+        points = sorted((d["adc"], d["ph"]) for d in cal_points.values())
+        if len(points) < 2:
+            raise ValueError("Need at least two calibration points")
+        temps = [d["temp"] for d in cal_points.values() if d.get("temp")]
+        if KINDS[kind] == NERNST:
+            # Least squares line through all points
+            n = len(points)
+            sx = sum(p[0] for p in points)
+            sy = sum(p[1] for p in points)
+            sxx = sum(p[0] * p[0] for p in points)
+            sxy = sum(p[0] * p[1] for p in points)
+            det = n * sxx - sx * sx
+            if not det:
+                raise ValueError("Calibration points have the same voltage")
+            slope = (n * sxy - sx * sy) / det
+            intercept = (sy - slope * sx) / n
+            x0, x1 = points[0][0], points[-1][0]
+            self._set_segments(array('f', (x0, x1)),
+                               array('f', (slope * x0 + intercept, slope * x1 + intercept)),
+                               self.ph_min, self.ph_max)
+        else:
+            self._set_segments(array('f', [p[0] for p in points]), array('f', [p[1] for p in points]),
+                               self.ph_min, self.ph_max)
+        self.kind = KINDS[kind]
+        self.cal_temp = sum(temps) / len(temps) if temps else None
+        self.key = points_key(cal_points)
+
+    def _set_segments(self, adc, ph, ph_min, ph_max):
+        size = len(adc)
+        if size < 2:
+            raise ValueError("Need at least two distinct calibration points")
+        slope = array('f', [0] * (size - 1))
+        intercept = array('f', [0] * (size - 1))
+        rising = ph[-1] > ph[0]
+        for i in range(size - 1):
+            if adc[i + 1] == adc[i]:
+                raise ValueError("Calibration points have the same voltage")
+            if (ph[i + 1] > ph[i]) != rising and ph[i + 1] != ph[i]:
+                raise ValueError("pH calibration curve is not monotonic")
+            slope[i] = (ph[i + 1] - ph[i]) / (adc[i + 1] - adc[i])
+            intercept[i] = ph[i] - slope[i] * adc[i]
+        self._install(adc, slope, intercept, ph_min, ph_max)
+
+    def _install(self, knots, slope, intercept, ph_min, ph_max):
+        # Swap the whole model at once, so a conversion never sees a half-built one
+        self._knots, self._slope, self._intercept = knots, slope, intercept
+        self.ph_min, self.ph_max = ph_min, ph_max
+        self.size = len(knots)
+        self.version += 1
+        if np is not None:
+            self._np_adc, self._np_ph = self._interp_table()
+
+    def _fixed_point(self):
+        version = self.version
+        knots, slope, intercept = self._knots, self._slope, self._intercept
+        n = len(knots)
+        min_m = int(round(self.ph_min * 1000))
+        max_m = int(round(self.ph_max * 1000))
+        knots_uv = array('l', [int(round(k * 1000000)) for k in knots])
+        ph0_m = array('l', [0] * (n - 1))
+        slope_q = array('l', [0] * (n - 1))
+        d_lim = array('l', [0] * (n - 1))
+        for i in range(n - 1):
+            ph0_m[i] = int(round((slope[i] * knots[i] + intercept[i]) * 1000))
+            slope_q[i] = int(round(slope[i] * (1 << _Q) / 1000))
+            # Past this offset the result is beyond both pH limits, clamping
+            # the offset there keeps the products in small ints
+            reach = abs(ph0_m[i] - min_m) + abs(ph0_m[i] - max_m) + 1
+            d_lim[i] = min(_D_MAX, (reach << _Q) // abs(slope_q[i]) + 1) if slope_q[i] else _D_MAX
+        self._knots_uv, self._ph0_m, self._slope_q, self._d_lim = knots_uv, ph0_m, slope_q, d_lim
+        self._min_m, self._max_m = min_m, max_m
+        self._fixed_version = version
+
+    def _interp_table(self):
+        # Knots plus the voltages where the end segments reach the pH limits,
+        # interpolation with clamped ends then gives the same result as convert()
+        n = self.size
+        adc = [self._knots[i] for i in range(n)]
+        ph = [self._slope[min(i, n - 2)] * adc[i] + self._intercept[min(i, n - 2)] for i in range(n)]
+        for end, seg in ((0, 0), (n - 1, n - 2)):
+            slope = self._slope[seg]
+            if not slope:
+                continue
+            for bound in (self.ph_min, self.ph_max):
+                x = (bound - self._intercept[seg]) / slope
+                if (end == 0 and x < adc[0]) or (end and x > adc[-1]):
+                    if end == 0:
+                        adc.insert(0, x)
+                        ph.insert(0, bound)
+                    else:
+                        adc.append(x)
+                        ph.append(bound)
+        return np.array(adc), np.array(ph)
+
+    def _segment(self, adc, knots=None):
+        if knots is None:
+            knots = self._knots
+        lo = 0
+        hi = self.size - 2
+        while lo < hi:
+            mid = (lo + hi + 1) >> 1
+            if knots[mid] <= adc:
+                lo = mid
+            else:
+                hi = mid - 1
+        return lo
+
+    def convert(self, adc, temp=None):
+        """Convert one voltage reading to pH, temp in C enables compensation."""
+        i = self._segment(adc)
+        ph = self._slope[i] * adc + self._intercept[i]
+        if ph < self.ph_min:
+            ph = self.ph_min
+        elif ph > self.ph_max:
+            ph = self.ph_max
+        if temp is None or self.cal_temp is None:
+            return ph
+        ph = 7 + (ph - 7) * (self.cal_temp + _KELVIN) / (temp + _KELVIN)
+        if ph < self.ph_min:
+            return self.ph_min
+        if ph > self.ph_max:
+            return self.ph_max
+        return ph
+
+    def convert_uv(self, uv, temp_cc=None):
+        """Integer convert(), microvolts to milli-pH, temp_cc in centi-degrees C.
+
+        Agrees with round(convert(uv / 1e6, temp_cc / 100) * 1000) within
+        1 milli-pH and allocates only small ints.
+        """
+        if self._fixed_version != self.version:
+            self._fixed_point()
+        i = self._segment(uv, self._knots_uv)
+        d = uv - self._knots_uv[i]
+        lim = self._d_lim[i]
+        if d > lim:
+            d = lim
+        elif d < -lim:
+            d = -lim
+        q = self._slope_q[i]
+        if d < 0:
+            d = -d
+            q = -q
+        # d * q >> _Q in 1/16 milli-pH, d split at 10 bits so no product leaves small ints
+        ph = self._ph0_m[i] + (((((d >> 10) * q) >> (_Q - 14)) + (((d & 1023) * q) >> (_Q - 4)) + 8) >> 4)
+        if ph < self._min_m:
+            ph = self._min_m
+        elif ph > self._max_m:
+            ph = self._max_m
+        if temp_cc is None or self._cal_ck is None:
+            return ph
+        t_ck = temp_cc + 27315
+        dev = (ph - 7000) * self._cal_ck
+        # Rounded half away from zero, like the float path's round()
+        ph = 7000 + ((dev + (t_ck >> 1)) // t_ck if dev >= 0 else -((-dev + (t_ck >> 1)) // t_ck))
+        if ph < self._min_m:
+            return self._min_m
+        if ph > self._max_m:
+            return self._max_m
+        return ph
+
+    def to_adc(self, ph):
+        """Voltage of a pH value, the inverse of convert() without temperature compensation."""
+        if not self.ready:
+            raise ValueError("pH converter is not calibrated")
+        knots, slope, intercept = self._knots, self._slope, self._intercept
+        last = self.size - 2
+        for i in range(last + 1):
+            a = slope[i] * knots[i] + intercept[i]
+            b = slope[i] * knots[i + 1] + intercept[i]
+            if slope[i] and min(a, b) <= ph <= max(a, b):
+                return (ph - intercept[i]) / slope[i]
+        # Beyond the knots, extend the end segment on that side
+        first = slope[0] * knots[0] + intercept[0]
+        rising = slope[0] * knots[last + 1] + intercept[last] > first
+        i = 0 if (ph < first) == rising else last
+        if not slope[i]:
+            raise ValueError("pH %s is out of the calibration range" % ph)
+        return (ph - intercept[i]) / slope[i]
+
+    def convert_batch(self, samples, out=None, temp=None):
+        """Convert a block of voltage readings to pH.
+
+        ndarray input is interpolated in one vectorized call, any other
+        sequence is written into out (a preallocated array('f') is reused
+        when given).
+        """
+        if not self.ready:
+            raise ValueError("pH converter is not calibrated")
+        if np is not None and hasattr(samples, "shape"):
+            ph = np.clip(np.interp(samples, self._np_adc, self._np_ph), self.ph_min, self.ph_max)
+            if temp is None or self.cal_temp is None:
+                return ph
+            ph = 7 + (ph - 7) * ((self.cal_temp + _KELVIN) / (temp + _KELVIN))
+            return np.clip(ph, self.ph_min, self.ph_max)
+        if out is None:
+            out = array('f', [0] * len(samples))
+        convert = self.convert
+        for i in range(len(samples)):
+            out[i] = convert(samples[i], temp)
+        return out
+
+    def copy_from(self, model):
+        """Take over another model in one swap, e.g. one fitted in the background."""
+        self.kind = model.kind
+        self.key = model.key
+        self.cal_temp = model.cal_temp
+        self._install(model._knots, model._slope, model._intercept, model.ph_min, model.ph_max)
+
+    def save(self, path):
+        cal_temp = float("nan") if self.cal_temp is None else self.cal_temp
+        with open(path, "wb") as f:
+            f.write(struct.pack(_HEADER, _MAGIC, self.kind, self.size, self.key, cal_temp,
+                                self.ph_min, self.ph_max))
+            f.write(self._knots)
+            f.write(self._slope)
+            f.write(self._intercept)
+
+    def load(self, path, key):
+        """Load a saved model, only if it was computed from points with this key.
+
+        A missing, truncated or empty file loads nothing, so the caller refits.
+        """
+        try:
+            with open(path, "rb") as f:
+                header = f.read(struct.calcsize(_HEADER))
+                magic, kind, size, saved_key, cal_temp, ph_min, ph_max = struct.unpack(_HEADER, header)
+                if magic != _MAGIC or saved_key != key or size < 2:
+                    return False
+                knots = array('f', f.read(4 * size))
+                slope = array('f', f.read(4 * (size - 1)))
+                intercept = array('f', f.read(4 * (size - 1)))
+        except (OSError, ValueError, _STRUCT_ERROR):
+            return False
+        if len(knots) != size or len(slope) != size - 1 or len(intercept) != size - 1:
+            return False
+        self.kind = kind
+        self.key = saved_key
+        self.cal_temp = None if cal_temp != cal_temp else cal_temp
+        self._install(knots, slope, intercept, ph_min, ph_max)
+        return True
@@ -0,0 +1,99 @@
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+from config_store import replace
+from ph_convert import PhConverter
+import log
+
+IDLE = "idle"
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+def validate_points(data):
+    """Return an error message for a malformed calibration upload, or None."""
+    if not isinstance(data, dict):
+        return "Calibration points must be an object"
+    if len(data) < 2:
+        return "Not enought calibration points"
+    for name, point in data.items():
+        if not isinstance(point, dict):
+            return "Wrong calibration point %s" % name
+        for field in ("ph", "adc"):
+            if not isinstance(point.get(field), (int, float)):
+                return "Calibration point %s has no %s value" % (name, field)
+    return None
+
+
+class Recalibrator:
+    """Background pH recalibration jobs.
+
+    submit() only queues the points, run() fits a new model off to the side,
+    yielding between stages, saves it and swaps it into the live converter
+    in one step. Listeners are called with (job, points) after the swap.
+    Uploads that arrive while a job runs are coalesced, only the latest
+    one is computed next.
+    """
+
+    def __init__(self, converter, model_path, kind="segments"):
+        self.converter = converter
+        self.model_path = model_path
+        self.kind = kind
+        self.listeners = []
+        self.job = 0
+        self.state = IDLE
+        self.done_job = 0
+        self.error = None
+        self._pending = None
+        self._event = asyncio.Event()
+
+    def submit(self, points):
+        self.job += 1
+        self._pending = (self.job, points)
+        self.state = QUEUED
+        self._event.set()
+        return self.job
+
+    def status(self):
+        return {
+            "job": self.job,
+            "state": self.state,
+            "done_job": self.done_job,
+            "version": self.converter.version,
+            "error": self.error,
+        }
+
+    async def run(self):
+        while True:
+            await self._event.wait()
+            self._event.clear()
+            if self._pending is None:
+                continue
+            job, points = self._pending
+            self._pending = None
+            self.state = RUNNING
+            try:
+                await self._recalibrate(job, points)
+                self.error = None
+            except Exception as e:
+                log.error("pH recalibration failed: %s", e)
+                self.error = str(e)
+            self.done_job = job
+            if self._pending is None:
+                self.state = FAILED if self.error else DONE
+
+    async def _recalibrate(self, job, points):
+        model = PhConverter(self.converter.ph_min, self.converter.ph_max)
+        model.fit(points, self.kind)
+        await asyncio.sleep(0)
+        tmp_path = self.model_path + ".tmp"
+        model.save(tmp_path)
+        replace(tmp_path, self.model_path)
+        await asyncio.sleep(0)
+        self.converter.copy_from(model)
+        for listener in self.listeners:
+            listener(job, points)
@@ -0,0 +1,202 @@
+import time
+from array import array
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+try:
+    # CPython, daemon threads don't hold up exit
+    import threading
+
+    def _start_thread(fn):
+        threading.Thread(target=fn, daemon=True).start()
+
+    allocate_lock = threading.Lock
+except ImportError:
+    import _thread
+
+    def _start_thread(fn):
+        _thread.start_new_thread(fn, ())
+
+    allocate_lock = _thread.allocate_lock
+
+import log
+from compat import (RETRY_MS, ThreadSafeFlag, thread_sleep_ms, thread_sleep_us, ticks_add, ticks_diff,
+                    ticks_ms, ticks_us)
+
+
+def _sleep_for_us(us):
+    # sleep_us busy-waits holding the GIL, sleep_ms lets the loop run
+    if us >= 1000:
+        thread_sleep_ms(us // 1000)
+        us %= 1000
+    if us > 0:
+        thread_sleep_us(us)
+
+
+class SampleQueue:
+    """Preallocated single producer, single consumer queue of (ticks_ms, value).
+
+    Only the producer moves head and only the consumer moves tail, a slot
+    is written before head passes it, so no lock is needed between one
+    thread and the event loop. One slot stays empty to tell full from
+    empty. A full queue drops new samples and counts them.
+    """
+
+    def __init__(self, size, typecode='f'):
+        self.size = size + 1
+        self.ticks = array('l', [0] * self.size)
+        self.values = array(typecode, [0] * self.size)
+        self.head = 0
+        self.tail = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return (self.head - self.tail) % self.size
+
+    def put(self, ticks, value):
+        head = self.head
+        nxt = head + 1
+        if nxt == self.size:
+            nxt = 0
+        if nxt == self.tail:
+            self.dropped += 1
+            return False
+        self.ticks[head] = ticks
+        self.values[head] = value
+        self.head = nxt
+        return True
+
+    def drain(self, consumer):
+        """Pass the queued samples to consumer(ticks, value), returns their number."""
+        tail = self.tail
+        head = self.head
+        n = 0
+        while tail != head:
+            consumer(self.ticks[tail], self.values[tail])
+            tail += 1
+            if tail == self.size:
+                tail = 0
+            self.tail = tail
+            n += 1
+        return n
+
+
+class SampleWorker:
+    """Fixed period sampling in a thread, off the event loop.
+
+    sample() is called every period_ms in the worker thread and its value
+    goes through a SampleQueue to consumer(ticks_ms, value), which run()
+    calls on the event loop whenever the worker flags new samples. A slow
+    request on the loop then only delays the consumer, not the sampling.
+    setup() runs in the thread before the first sample and after an error.
+
+    lock (an allocate_lock()) is held around sample(), code on the loop
+    that uses the same device takes it too, setup() takes it itself if it
+    needs it. Lateness of every
+    sample against its slot is kept in late_max_us/late_total_us, periods
+    missed entirely are skipped and counted in overruns.
+    """
+
+    def __init__(self, sample, period_ms, consumer, setup=None, size=64, typecode='f', lock=None):
+        self.sample = sample
+        self.period_ms = period_ms
+        self.consumer = consumer
+        self.setup = setup
+        self.queue = SampleQueue(size, typecode)
+        self.lock = lock if lock is not None else allocate_lock()
+        self.running = False
+        self.samples = 0
+        self.errors = 0
+        self.overruns = 0
+        self.late_max_us = 0
+        self.late_total_us = 0
+        self._error = None
+        self._logged_errors = 0
+        self._flag = ThreadSafeFlag()
+
+    def start(self):
+        if not self.running:
+            self.running = True
+            _start_thread(self._loop)
+
+    def stop(self):
+        """The thread ends after its current period."""
+        self.running = False
+
+    def _loop(self):
+        period_us = self.period_ms * 1000
+        queue = self.queue
+        ready = False
+        due = ticks_us()
+        while self.running:
+            left = ticks_diff(due, ticks_us())
+            if left > 0:
+                _sleep_for_us(left)
+            late = max(0, ticks_diff(ticks_us(), due))
+            try:
+                if not ready:
+                    if self.setup is not None:
+                        self.setup()
+                    ready = True
+                with self.lock:
+                    value = self.sample()
+            except OSError as e:
+                # Logging isn't thread safe, run() reports the error
+                self.errors += 1
+                self._error = e
+                ready = False
+                self._flag.set()
+                thread_sleep_ms(RETRY_MS)
+                due = ticks_us()
+                continue
+            queue.put(ticks_ms(), value)
+            self.samples += 1
+            self.late_total_us += late
+            if late > self.late_max_us:
+                self.late_max_us = late
+            self._flag.set()
+            due = ticks_add(due, period_us)
+            if late > period_us:
+                # Skip the slots already missed instead of sampling in a burst
+                missed = late // period_us
+                self.overruns += missed
+                due = ticks_add(due, missed * period_us)
+
+    def stats(self):
+        return {"samples": self.samples, "errors": self.errors, "dropped": self.queue.dropped,
+                "overruns": self.overruns, "late_max_us": self.late_max_us,
+                "late_avg_us": self.late_total_us // self.samples if self.samples else 0}
+
+    async def run(self):
+        self.start()
+        while True:
+            await self._flag.wait()
+            self.queue.drain(self.consumer)
+            if self.errors != self._logged_errors:
+                self._logged_errors = self.errors
+                log.error("Sampling thread error: %s", self._error)
+
+
+if __name__ == "__main__":
+    # Host measurement: 1 kHz sampling while the loop is blocked for up
+    # to 20ms at a time, as a slow request would
+    async def main(seconds=5, period_ms=1):
+        received = []
+        worker = SampleWorker(lambda: 0, period_ms, lambda ticks, value: received.append(ticks), size=256)
+        asyncio.create_task(worker.run())
+        end = ticks_ms() + seconds * 1000
+        i = 0
+        while ticks_ms() < end:
+            time.sleep((i % 20) / 1000)
+            i += 1
+            await asyncio.sleep(0)
+        worker.stop()
+        stats = worker.stats()
+        stats["received"] = len(received)
+        stats["rate_hz"] = len(received) / seconds
+        print(stats)
+
+    asyncio.run(main())
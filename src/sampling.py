@@ -0,0 +1,189 @@
+from array import array
+
+try:
+    from ulab import numpy as np
+    _NP_FLOAT = np.float
+except ImportError:
+    try:
+        import numpy as np
+        _NP_FLOAT = np.float32
+    except ImportError:
+        np = None
+        _NP_FLOAT = None
+
+
+class RingBuffer:
+    """Preallocated ring buffer with a running sum for O(1) windowed mean.
+
+    With an integer typecode the sum and the mean are ints too, e.g. for
+    samples in microvolts.
+    """
+
+    def __init__(self, size, typecode='f'):
+        self.size = size
+        self.typecode = typecode
+        self.fixed = typecode not in ('f', 'd')
+        self.data = array(typecode, [0] * size)
+        self.index = 0
+        self.count = 0
+        self.total = 0
+
+    def push(self, value):
+        data = self.data
+        i = self.index
+        if self.count == self.size:
+            self.total -= data[i]
+        else:
+            self.count += 1
+        data[i] = value
+        # Read back the stored value, so float32 rounding doesn't leak into the sum
+        self.total += data[i]
+        i += 1
+        if i == self.size:
+            i = 0
+            if self.count == self.size:
+                # Resync the running sum once per lap to stop float drift
+                total = 0
+                for v in data:
+                    total += v
+                self.total = total
+        self.index = i
+
+    def clear(self):
+        self.index = 0
+        self.count = 0
+        self.total = 0
+
+    @property
+    def full(self):
+        return self.count == self.size
+
+    @property
+    def latest(self):
+        if not self.count:
+            return None
+        return self.data[self.index - 1]
+
+    def mean(self):
+        if not self.count:
+            return None
+        if self.fixed:
+            return (self.total + (self.count >> 1)) // self.count
+        return self.total / self.count
+
+    def view(self):
+        """Zero-copy view of the stored samples, in storage order."""
+        return memoryview(self.data)[:self.count]
+
+    def as_ndarray(self):
+        """Zero-copy ulab/numpy array over the buffer, in storage order."""
+        if np is None or self.typecode != 'f':
+            return None
+        return np.frombuffer(self.data, dtype=_NP_FLOAT, count=self.count)
+
+
+class MovingMedian:
+    """Median over the last size samples.
+
+    Keeps a sorted shadow of the ring buffer and moves one slot per sample,
+    so the median is a lookup and nothing is allocated per update.
+    """
+
+    def __init__(self, size, typecode='f'):
+        self.ring = RingBuffer(size, typecode)
+        self.sorted = array(typecode, [0] * size)
+
+    def push(self, value):
+        ring = self.ring
+        s = self.sorted
+        n = ring.count
+        if n == ring.size:
+            # Drop the sample that is about to be overwritten
+            old = ring.data[ring.index]
+            i = 0
+            while s[i] != old:
+                i += 1
+            n -= 1
+            while i < n:
+                s[i] = s[i + 1]
+                i += 1
+        ring.push(value)
+        value = ring.latest
+        i = n
+        while i > 0 and s[i - 1] > value:
+            s[i] = s[i - 1]
+            i -= 1
+        s[i] = value
+
+    def median(self):
+        n = self.ring.count
+        if not n:
+            return None
+        half = n >> 1
+        if n & 1:
+            return self.sorted[half]
+        if self.ring.fixed:
+            return (self.sorted[half - 1] + self.sorted[half] + 1) >> 1
+        return (self.sorted[half - 1] + self.sorted[half]) / 2
+
+
+class Ema:
+    """Exponential moving average, seeded with the first sample."""
+
+    def __init__(self, alpha):
+        self.alpha = alpha
+        self.value = None
+
+    def push(self, value):
+        if self.value is None:
+            self.value = value
+        else:
+            self.value += self.alpha * (value - self.value)
+        return self.value
+
+
+class FixedEma:
+    """Ema of integer samples, alpha is kept in 1/256 steps."""
+
+    def __init__(self, alpha):
+        self.alpha = int(alpha * 256 + 0.5)
+        self.value = None
+
+    def push(self, value):
+        if self.value is None:
+            self.value = value
+        else:
+            self.value += (self.alpha * (value - self.value) + 128) >> 8
+        return self.value
+
+
+class SensorChannel:
+    """Windowed mean, median and EMA of one sensor channel.
+
+    typecode 'l' keeps integer samples (fixed point, e.g. millivolts) and
+    integer statistics.
+    """
+
+    def __init__(self, window, alpha=0.2, typecode='f'):
+        self.median_filter = MovingMedian(window, typecode)
+        self.ema_filter = Ema(alpha) if typecode in ('f', 'd') else FixedEma(alpha)
+        self.samples = 0
+
+    @property
+    def buffer(self):
+        return self.median_filter.ring
+
+    def push(self, value):
+        self.median_filter.push(value)
+        self.ema_filter.push(value)
+        self.samples += 1
+
+    def mean(self):
+        return self.median_filter.ring.mean()
+
+    def median(self):
+        return self.median_filter.median()
+
+    @property
+    def ema(self):
+        return self.ema_filter.value
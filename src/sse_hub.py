@@ -0,0 +1,222 @@
+import json
+import time
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+from compat import sleep_ms as _sleep_ms
+
+# How often a client's microdot queue is checked while it drains
+DRAIN_POLL_MS = 50
+
+
+def _direct_queue(sse):
+    # microdot 2.x keeps sent frames in a plain list plus an Event, other
+    # versions go through the public send()
+    return isinstance(getattr(sse, "queue", None), list) and hasattr(getattr(sse, "event", None), "set")
+
+
+def _split_frame(frame):
+    """(data, event id) of a frame from make_frame(), None for a comment."""
+    if frame.startswith(b":"):
+        return None
+    event_id = None
+    if frame.startswith(b"id: "):
+        line, frame = frame.split(b"\n", 1)
+        event_id = line[4:].decode()
+    return frame[6:-2], event_id
+
+
+async def send_frame(sse, frame):
+    """Send an already framed event, once the previous one went out.
+
+    With the microdot queue the bytes are built once per update and
+    shared by every client. Nothing is queued while the client still has
+    a frame pending, so a stalled client never holds more than one frame
+    there and the Subscriber queue does the dropping.
+    """
+    if _direct_queue(sse):
+        while sse.queue:
+            await _sleep_ms(DRAIN_POLL_MS)
+        sse.queue.append(frame)
+        sse.event.set()
+        return
+    parts = _split_frame(frame)
+    # send() can't write a comment, heartbeats are skipped then
+    if parts is not None:
+        await sse.send(parts[0], event_id=parts[1])
+
+
+# SSE comment line, ignored by EventSource but keeps the connection alive
+# and lets microdot notice a dead client on the failed write
+HEARTBEAT = b": hb\n\n"
+
+
+def make_frame(data, event_id=None):
+    if isinstance(data, (dict, list)):
+        data = json.dumps(data)
+    if isinstance(data, str):
+        data = data.encode()
+    frame = b"data: " + data + b"\n\n"
+    if event_id is not None:
+        frame = b"id: " + event_id.encode() + b"\n" + frame
+    return frame
+
+
+class ClientLimit:
+    """Concurrent SSE client budget, can be shared between streams."""
+
+    def __init__(self, max_clients):
+        self.max_clients = max_clients
+        self.active = 0
+
+    @property
+    def full(self):
+        return self.active >= self.max_clients
+
+    def acquire(self):
+        if self.full:
+            return False
+        self.active += 1
+        return True
+
+    def release(self):
+        self.active -= 1
+
+
+class Subscriber:
+    """Bounded frame queue of one SSE client.
+
+    When a slow client falls behind the oldest frames are dropped, with the
+    default size of one a client only ever gets the latest state.
+    """
+
+    def __init__(self, maxlen=1):
+        self.maxlen = maxlen
+        self.queue = []
+        self.event = asyncio.Event()
+        self.dropped = 0
+
+    def put(self, frame):
+        if len(self.queue) >= self.maxlen:
+            self.queue.pop(0)
+            self.dropped += 1
+        self.queue.append(frame)
+        self.event.set()
+
+    async def get(self):
+        while not self.queue:
+            self.event.clear()
+            await self.event.wait()
+        return self.queue.pop(0)
+
+
+class Broadcast:
+    """Single producer SSE stream.
+
+    publish() serializes a state change once and fans the frame out to all
+    subscribers, handlers only wait on their own queue.
+    """
+
+    def __init__(self, name, maxlen=1, limit=None, heartbeat=15, idle_timeout=None):
+        self.name = name
+        self.maxlen = maxlen
+        self.limit = limit if limit is not None else ClientLimit(4)
+        self.heartbeat = heartbeat
+        self.idle_timeout = idle_timeout
+        self.subscribers = []
+        self.frame = None
+        self.data = None
+        self.version = 0
+        self.event_id = None
+        self._resume_frame = None
+        self._pending = None
+        # Event ids carry the boot time, so ids from before a reboot never match
+        self._epoch = int(time.time())
+
+    @property
+    def full(self):
+        return self.limit.full
+
+    def publish(self, data, not_modified=None):
+        """Send data to all subscribers if it changed.
+
+        not_modified is an optional short payload sent instead of the full
+        state to a client that resumes with the current event id.
+        """
+        if isinstance(data, (dict, list)):
+            data = json.dumps(data)
+        if data == self.data:
+            return False
+        self.data = data
+        self.version += 1
+        self.event_id = "%d-%d" % (self._epoch, self.version)
+        frame = make_frame(data, self.event_id)
+        self.frame = frame
+        self._resume_frame = None if not_modified is None else make_frame(not_modified, self.event_id)
+        for sub in self.subscribers:
+            sub.put(frame)
+        return True
+
+    def publish_lazy(self, source, not_modified=None):
+        """Publish source() only once a client is listening, not_modified is a callable too."""
+        self._pending = (source, not_modified)
+        if self.subscribers:
+            self._publish_pending()
+
+    def _publish_pending(self):
+        if self._pending is not None:
+            source, not_modified = self._pending
+            self._pending = None
+            self.publish(source(), not_modified() if not_modified is not None else None)
+
+    def subscribe(self, last_event_id=None):
+        self._publish_pending()
+        sub = Subscriber(self.maxlen)
+        # A resumed client that already has the current state gets nothing
+        # (or the not modified marker) until the next change
+        if self.frame is not None:
+            if last_event_id != self.event_id:
+                sub.put(self.frame)
+            elif self._resume_frame is not None:
+                sub.put(self._resume_frame)
+        self.subscribers.append(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        if sub in self.subscribers:
+            self.subscribers.remove(sub)
+
+    async def serve(self, sse, last_event_id=None):
+        """Forward published frames to one SSE client until it goes away.
+
+        Sends a heartbeat comment when nothing was published for heartbeat
+        seconds and closes the stream after idle_timeout seconds without
+        updates, if set.
+        """
+        if not self.limit.acquire():
+            return
+        sub = self.subscribe(last_event_id)
+        idle = 0
+        direct = _direct_queue(sse)
+        try:
+            while True:
+                if direct:
+                    # Take the next frame only once the last one went out,
+                    # a slow client then gets the latest state
+                    while sse.queue:
+                        await _sleep_ms(DRAIN_POLL_MS)
+                try:
+                    frame = await asyncio.wait_for(sub.get(), self.heartbeat)
+                    idle = 0
+                except asyncio.TimeoutError:
+                    idle += self.heartbeat
+                    if self.idle_timeout and idle >= self.idle_timeout:
+                        break
+                    frame = HEARTBEAT
+                await send_frame(sse, frame)
+        finally:
+            self.unsubscribe(sub)
+            self.limit.release()
@@ -0,0 +1,96 @@
+import json
+import os
+
+try:
+    import uhashlib as hashlib
+    import ubinascii as binascii
+except ImportError:
+    import hashlib
+    import binascii
+
+
+def _exists(path):
+    try:
+        os.stat(path)
+        return True
+    except OSError:
+        return False
+
+
+def file_etag(path):
+    h = hashlib.sha256()
+    buf = bytearray(512)
+    mv = memoryview(buf)
+    with open(path, "rb") as f:
+        while True:
+            n = f.readinto(buf)
+            if not n:
+                break
+            h.update(mv[:n])
+    return 'W/"%s"' % binascii.hexlify(h.digest()[:8]).decode()
+
+
+def load_manifest(path):
+    """Page entries of the build manifest written by build_extension.py, {} without a build."""
+    try:
+        with open(path) as f:
+            return json.load(f).get("pages", {})
+    except (OSError, ValueError):
+        return {}
+
+
+class StaticPage:
+    """Extension page with an optional build-time gzip variant.
+
+    The ETag is a content hash computed once on first use, the same tag is
+    used for both encodings, so it is weak and responses carry Vary. With
+    a manifest entry for the page the tag and the variants on flash come
+    from the build and nothing is hashed or stat'ed at runtime.
+    """
+
+    def __init__(self, path, manifest=None):
+        self.path = path
+        entry = manifest.get(path) if manifest else None
+        if entry is not None:
+            self.gzip = entry["gz"]
+            self.raw = entry["raw"]
+            self._etag = entry["etag"]
+        else:
+            self.gzip = _exists(path + ".gz")
+            self.raw = _exists(path)
+            self._etag = None
+
+    @property
+    def etag(self):
+        """Content hash of the page, None if neither variant is on flash."""
+        if self._etag is None:
+            try:
+                self._etag = file_etag(self.path if self.raw else self.path + ".gz")
+            except OSError:
+                return None
+        return self._etag
+
+    def not_modified(self, request):
+        return request.headers.get("If-None-Match") == self.etag
+
+    def use_gzip(self, request):
+        if not self.gzip:
+            return False
+        # Only the gz variant may be on flash, then serve it anyway
+        return "gzip" in request.headers.get("Accept-Encoding", "") or not self.raw
+
+
+class CachedJson:
+    """JSON value serialized on first use, until invalidate() is called."""
+
+    def __init__(self, getter):
+        self.getter = getter
+        self._value = None
+
+    def get(self):
+        if self._value is None:
+            self._value = json.dumps(self.getter())
+        return self._value
+
+    def invalidate(self):
+        self._value = None
@@ -0,0 +1,92 @@
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+from compat import ThreadSafeFlag
+
+
+class ThresholdAlert:
+    """Hardware window comparator on one ADS1x15 channel.
+
+    The chip converts continuously and checks every result against the
+    limits itself, ALERT/RDY (active low) changes only when the input
+    leaves or re-enters the range, so nothing is read or converted on the
+    MCU to notice a crossed limit. The pin interrupt wakes run(), which
+    keeps out_of_range set while the input is outside the limits and calls
+    listeners with (alert, active) on every change.
+
+    queue 0/1/2 needs 1/2/4 conversions past a limit before the alert.
+    Another reader of the channel (an Oversampler) calls start() instead of
+    its own conversion_start(), so both share the conversions. lock, a
+    thread lock, is held while the comparator is programmed when the chip
+    is also read from a SampleWorker thread.
+    """
+
+    def __init__(self, adc, pin, trigger, channel1=0, channel2=None, rate=4, queue=2, lock=None):
+        self.adc = adc
+        self.pin = pin
+        self.channel1 = channel1
+        self.channel2 = channel2
+        self.rate = rate
+        self.queue = queue
+        self.lock = lock
+        self.low = None
+        self.high = None
+        self.active = False
+        self.changes = 0
+        self.running = False
+        self.out_of_range = asyncio.Event()
+        self.listeners = []
+        self._flag = ThreadSafeFlag()
+        pin.irq(handler=self._irq, trigger=trigger)
+
+    def _irq(self, pin):
+        self._flag.set()
+
+    def set_limits(self, low, high):
+        """Range in volts, the comparator is reprogrammed if it runs."""
+        self.low = low
+        self.high = high
+        if self.running:
+            self.start()
+
+    def start(self):
+        """Start continuous conversion with the comparator on."""
+        if self.lock is None:
+            return self._start()
+        with self.lock:
+            self._start()
+
+    def _start(self):
+        adc = self.adc
+        if self.low is None:
+            # No limits yet, a full scale window never alerts
+            low, high = adc.v_to_raw(-1000), adc.v_to_raw(1000)
+        else:
+            low, high = adc.v_to_raw(self.low), adc.v_to_raw(self.high)
+        adc.alert_start(self.rate, self.channel1, self.channel2, high, low,
+                        latched=False, window=True, queue=self.queue)
+        self.running = True
+
+    def _update(self):
+        active = not self.pin.value()
+        if active == self.active:
+            return
+        self.active = active
+        self.changes += 1
+        if active:
+            self.out_of_range.set()
+        else:
+            self.out_of_range.clear()
+        for listener in self.listeners:
+            listener(self, active)
+
+    async def run(self):
+        if not self.running:
+            self.start()
+        while True:
+            await self._flag.wait()
+            if hasattr(self._flag, "clear"):
+                self._flag.clear()
+            self._update()
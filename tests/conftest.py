@@ -0,0 +1,23 @@
+import os
+import sys
+
+import pytest
+
+import sim
+
+
+@pytest.fixture(scope="module")
+def simulator():
+    """sim.install() for the tests of one module, undone afterwards.
+
+    Firmware modules imported meanwhile keep the simulated clock, they are
+    dropped so the next import gets the real one.
+    """
+    before = set(sys.modules)
+    sim.install()
+    yield
+    sim.uninstall()
+    for name in set(sys.modules) - before:
+        path = getattr(sys.modules[name], "__file__", None) or ""
+        if path.startswith((sim.SRC, sim.MODULES)):
+            del sys.modules[name]
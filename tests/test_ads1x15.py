@@ -0,0 +1,95 @@
+"""ads1x15 driver against the register model of the simulator.
+
+The async reads must return what read() returns, with fewer I2C
+transactions than its busy polling.
+"""
+import pytest
+
+from sim import board, waveforms
+from sim.ads1115 import ADS1015Model, ADS1115Model
+from sim.clock import CLOCK, VirtualLoop
+
+VOLTS = (1.0, 0.25)
+RATE = 4
+READS = 20
+
+
+def run(coro):
+    loop = VirtualLoop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+@pytest.fixture(params=("ADS1115", "ADS1015"))
+def chip(simulator, request):
+    """(driver, model) of one chip on a fresh bus, VOLTS on AIN0/AIN1."""
+    import ads1x15
+    from machine import I2C, Pin
+
+    board.reset()
+    Pin.reset()
+    CLOCK.now = 1.0
+    model_class = ADS1115Model if request.param == "ADS1115" else ADS1015Model
+    model = board.add_i2c_device(model_class(0x48, alert_pin=Pin(4)))
+    for channel, volts in enumerate(VOLTS):
+        model.set_input(channel, waveforms.constant(volts))
+    return getattr(ads1x15, request.param)(I2C(0), 0x48), model
+
+
+def expected(adc, volts):
+    return adc.v_to_raw(volts)
+
+
+def test_read_async_matches_read(chip):
+    adc, _ = chip
+    values = [adc.read(RATE, 0) for _ in range(READS)]
+    polled = adc.i2c_transactions
+    adc.reset_counters()
+
+    async def read_all():
+        return [await adc.read_async(RATE, 0) for _ in range(READS)]
+    assert run(read_all()) == values == [expected(adc, VOLTS[0])] * READS
+    # A config write, one config read and the result, read() polls the config meanwhile
+    assert adc.i2c_transactions == 3 * READS
+    assert adc.i2c_transactions < polled
+
+
+def test_read_rev_async_round_robin(chip):
+    adc, _ = chip
+
+    async def scan():
+        values = []
+        adc.set_conv(RATE, 0)
+        await adc.read_rev_async()
+        for i in range(READS):
+            # The result is the previous channel, the write starts the next one
+            adc.set_conv(RATE, (i + 1) % 2)
+            values.append(await adc.read_rev_async())
+        return values
+    values = run(scan())
+    assert values == [expected(adc, VOLTS[i % 2]) for i in range(READS)]
+    assert adc.i2c_transactions == 2 * (READS + 1)
+
+
+@pytest.mark.parametrize("ready_pin", (False, True))
+def test_alert_read_async(chip, ready_pin):
+    adc, model = chip
+    from machine import Pin
+
+    async def stream():
+        if ready_pin:
+            adc.attach_ready_pin(Pin(4, mode=Pin.IN, pull=Pin.PULL_UP), Pin.IRQ_FALLING)
+        adc.conversion_start(RATE, 0)
+        adc.reset_counters()
+        start = CLOCK.now
+        values = [await adc.alert_read_async() for _ in range(READS)]
+        return values, (CLOCK.now - start) / model.period
+    values, periods = run(stream())
+    assert values == [expected(adc, VOLTS[0])] * READS
+    # One register read per result, nothing is polled
+    assert adc.i2c_transactions == READS
+    if ready_pin:
+        # Woken once per conversion, none is read twice or skipped
+        assert READS - 1 < periods < READS + 1
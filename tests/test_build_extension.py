@@ -0,0 +1,27 @@
+"""Page minification and the module list of the extension build."""
+import os
+
+from build_extension import MODULE_LIST, MODULES, SRC, minify_html
+
+SCRIPT = """<script>
+    const row = `
+        <td>${name}</td>`
+    // <!-- not a comment -->
+    let url = "http://host"
+</script>"""
+
+
+def test_minify_drops_comments():
+    page = "<html>\n  <!-- one line -->\n  <body>\n    <!--\n    <p>old</p>\n    -->\n  </body>\n</html>\n"
+    assert minify_html(page) == "<html>\n<body>\n</body>\n</html>\n"
+
+
+def test_minify_keeps_scripts():
+    page = "<body>\n    <!-- <script>old()</script> -->\n    %s\n</body>\n" % SCRIPT
+    assert minify_html(page) == "<body>\n%s\n</body>\n" % SCRIPT
+
+
+def test_module_list():
+    # Every extension source in src is built, the list itself stays source
+    sources = {name for name in os.listdir(SRC) if name.endswith(".py")}
+    assert sources == set(MODULES) | {MODULE_LIST}
@@ -0,0 +1,30 @@
+import asyncio
+import threading
+
+
+def test_thread_safe_flag_set_before_wait(simulator):
+    from compat import ThreadSafeFlag
+
+    async def main():
+        flag = ThreadSafeFlag()
+        flag.set()
+        await asyncio.wait_for(flag.wait(), 1)
+        # wait() clears the flag
+        try:
+            await asyncio.wait_for(flag.wait(), 0.05)
+        except asyncio.TimeoutError:
+            return True
+        return False
+    assert asyncio.run(main())
+
+
+def test_thread_safe_flag_set_from_thread(simulator):
+    from compat import ThreadSafeFlag
+
+    async def main():
+        flag = ThreadSafeFlag()
+        waiter = asyncio.ensure_future(flag.wait())
+        await asyncio.sleep(0)
+        threading.Thread(target=flag.set).start()
+        await asyncio.wait_for(waiter, 1)
+    asyncio.run(main())
@@ -0,0 +1,75 @@
+"""The fixed point sensor path against the float one, on the simulator.
+
+    python -m pytest tests
+"""
+import random
+
+import numpy
+import pytest
+
+from bench.calibration import cal_points, load_extension
+
+# Calibration models the pH probe can be fitted with
+MODELS = ((2, "segments"), (5, "segments"), (10, "segments"), (5, "nernst"))
+# Probe temperatures in centi-degrees, None is the calibration temperature
+TEMPS_CC = (None, 1500, 2500, 3250)
+# (block, decimation) of the oversampling profiles, 1024 is past acquisition.EXACT_SUM
+PROFILES = ((64, 1), (64, 4), (64, 16), (64, 64), (192, 3), (2048, 512), (2048, 1024))
+
+
+@pytest.fixture(scope="module")
+def ext(simulator):
+    return load_extension()
+
+
+def test_adc_to_mv(ext):
+    # adc_to_volt() rounds to 10mV, adc_to_mv() to 1mV
+    mismatches = [v for v in range(4096) if abs(ext.adc_to_mv(v) - ext.adc_to_volt(v) * 1000) > 5.5]
+    assert not mismatches
+
+
+@pytest.mark.parametrize("n, kind", MODELS)
+def test_convert_uv(ext, n, kind):
+    converter = ext.PhConverter()
+    converter.fit(cal_points(n), kind)
+    converter.cal_temp = 25
+    mismatches = []
+    for i in range(-500, 4500, 7):
+        for temp_cc in TEMPS_CC:
+            ph = converter.convert(i / 1000, None if temp_cc is None else temp_cc / 100)
+            if abs(converter.convert_uv(i * 1000, temp_cc) - round(ph * 1000)) > 1:
+                mismatches.append((i * 1000, temp_cc))
+    # Within 1 milli-pH of the rounded float result
+    assert not mismatches
+
+
+def _blocks(block):
+    rng = random.Random(block)
+    yield [32767] * block
+    yield [-32768] * block
+    for _ in range(20):
+        yield [rng.randint(-32768, 32767) for _ in range(block)]
+
+
+@pytest.mark.parametrize("filter", ("mean", "median"))
+@pytest.mark.parametrize("block, decimation", PROFILES)
+@pytest.mark.parametrize("dtype", (numpy.float64, numpy.float32))
+def test_decimate_uv_vectorized(simulator, filter, block, decimation, dtype):
+    # float32 stands in for ulab on the board
+    from acquisition import AcqProfile, Oversampler
+    from ads1x15 import ADS1115
+    from machine import I2C
+
+    sampler = Oversampler(ADS1115(I2C(0)), profile=AcqProfile(block=block, decimation=decimation, filter=filter),
+                          fixed=True)
+    sampler._np_float = numpy.zeros(block, dtype=dtype)
+    np_buffer = sampler._np_buffer
+    for values in _blocks(block):
+        sampler.buffer[:] = type(sampler.buffer)('h', values)
+        vectorized = list(sampler.decimate_uv())
+        sampler._np_buffer = None
+        sampler._np_float = None
+        loop = list(sampler.decimate_uv())
+        sampler._np_buffer = np_buffer
+        sampler._np_float = numpy.zeros(block, dtype=dtype)
+        assert vectorized == loop
@@ -0,0 +1,27 @@
+"""The pH calibration chart against the model readings are converted with."""
+import json
+
+import pytest
+
+from bench.calibration import cal_points, load_extension
+
+
+@pytest.fixture(scope="module")
+def ext(simulator):
+    return load_extension()
+
+
+@pytest.mark.parametrize("kind", ("segments", "nernst"))
+def test_chart_follows_model(ext, monkeypatch, kind):
+    points = cal_points(5)
+    monkeypatch.setattr(ext, "ph_cal_points", points)
+    monkeypatch.setattr(ext, "PH_MODEL_KIND", kind)
+    ext.ph_converter.fit(points, kind)
+    ext.publish_ph_chart()
+    chart = json.loads(ext.ph_chart.get("json"))
+    assert chart["AdcPoints"] == sorted(chart["AdcPoints"])
+    assert [ext.ph_converter.convert(v) for v in chart["AdcPoints"]] == chart["PhPoints"]
+    # The curve spans the full pH range and passes the calibration voltages
+    assert min(chart["PhPoints"]) == pytest.approx(ext.ph_converter.ph_min, abs=1e-3)
+    assert max(chart["PhPoints"]) == pytest.approx(ext.ph_converter.ph_max, abs=1e-3)
+    assert [a for _, a in chart["PhChartPoints"]] == sorted(d["adc"] for d in points.values())
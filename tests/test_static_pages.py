@@ -0,0 +1,29 @@
+"""Extension pages served from flash, with and without a gzip variant."""
+import gzip
+
+import pytest
+
+
+@pytest.fixture(scope="module")
+def static_pages(simulator):
+    import static_pages
+    return static_pages
+
+
+@pytest.mark.parametrize("raw, gz", ((True, False), (False, True), (True, True)))
+def test_etag(static_pages, tmp_path, raw, gz):
+    path = str(tmp_path / "page.html")
+    if raw:
+        with open(path, "wb") as f:
+            f.write(b"<p>page</p>")
+    if gz:
+        with open(path + ".gz", "wb") as f:
+            f.write(gzip.compress(b"<p>page</p>"))
+    page = static_pages.StaticPage(path)
+    assert page.etag.startswith('W/"')
+    assert page.etag == static_pages.file_etag(path if raw else path + ".gz")
+
+
+def test_etag_missing_page(static_pages, tmp_path):
+    page = static_pages.StaticPage(str(tmp_path / "page.html"))
+    assert page.etag is None